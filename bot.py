@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
+import asyncio
 import logging
+import os
 from telegram.ext import Application
-from config import BOT_TOKEN
+import config
+from config import BOT_TOKEN, MAX_CONCURRENT_UPDATES, RUN_MODE, METRICS_LISTEN, METRICS_PORT, PERSISTENCE_INTERVAL
+from database import db
 from handlers import client, admin
+from services import metrics, images, broadcast, notifications, pricing, render
+from services.persistence import JournalPersistence
+from services.ratelimit import PriorityRateLimiter
+from services.updates import PerUserUpdateProcessor
+from services.webhook import serve_webhook
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -10,19 +19,120 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Фоновые циклы бота; Application.stop() ждёт задачи из create_task,
+# поэтому бесконечные циклы запускаются отдельно и отменяются в post_stop
+background_tasks = []
+servers = []
+
+async def flush_periodically():
+    while True:
+        await asyncio.sleep(db.USERS_FLUSH_INTERVAL)
+        try:
+            await db.aflush_users()
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи визитов: {e}")
+
+async def post_init(application):
+    background_tasks.append(asyncio.create_task(flush_periodically()))
+    bouquets = await db.aget_bouquets()
+    # Таблицы цен всего каталога - сразу, до первых покупателей
+    pricing.warm_up(bouquets)
+    # Готовые варианты фото пропускаются, так что после рестарта это быстро
+    for bouquet in bouquets:
+        if os.path.exists(bouquet.get('image_path', '')):
+            images.schedule_optimize(bouquet['image_path'])
+    if METRICS_PORT:
+        servers.append(await metrics.start_server(METRICS_LISTEN, METRICS_PORT))
+    # Рассылка, прерванная рестартом, продолжается с сохранённого места
+    broadcast.resume(application)
+
+async def post_stop(application):
+    await broadcast.shutdown()
+    await notifications.shutdown()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+    servers.clear()
+
+async def post_shutdown(application):
+    await db.aflush_users()
+
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+def build_application(builder=None):
+    """Собрать Application со всеми хендлерами (общее для polling и webhook)"""
+    builder = builder or Application.builder().token(BOT_TOKEN)
+    if METRICS_PORT:
+        # Те же размеры пулов, что ставит PTB по умолчанию
+        builder = (
+            builder
+            .request(metrics.InstrumentedRequest(connection_pool_size=256))
+            .get_updates_request(metrics.InstrumentedRequest(connection_pool_size=1))
+        )
+    if config.OUTBOUND_RATE:
+        # Все запросы к Bot API идут через общую очередь с приоритетами
+        builder = builder.rate_limiter(PriorityRateLimiter(
+            overall_rate=config.OUTBOUND_RATE,
+            chat_rate=config.OUTBOUND_CHAT_RATE,
+            chat_burst=config.OUTBOUND_CHAT_BURST
+        ))
+    application = (
+        builder
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        # Незаконченные заказы и шаги диалогов переживают рестарт
+        .persistence(JournalPersistence(update_interval=PERSISTENCE_INTERVAL))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    
+    client.register_handlers(application)
+    admin.register_handlers(application)
+    
+    if METRICS_PORT:
+        metrics.instrument_handlers(application)
+        db.add_io_hook(metrics.observe_storage_io)
+        metrics.gauge('bot_storage_cache', "Счетчики кэша YAML-файлов", lambda: {
+            (('kind', key),): value for key, value in db.get_cache_stats().items()
+        })
+        metrics.gauge('bot_render_cache', "Счетчики кэша подписей и клавиатур", lambda: {
+            (('kind', key),): value for key, value in render.get_stats().items()
+        })
+    return application
+
 def main():
     logger.info("🌹 Запуск бота...")
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Данные и индексы загружаются один раз при старте
+    db.warm_up()
     
-    client.register_handlers(application)
-    admin.register_handlers(application)
+    application = build_application()
     
     logger.info("✅ Бот запущен!")
-    application.run_polling(
-        allowed_updates=["message", "callback_query"],
-        drop_pending_updates=True
-    )
+    if RUN_MODE == 'webhook':
+        asyncio.run(serve_webhook(
+            application,
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            path=config.WEBHOOK_PATH,
+            url=config.WEBHOOK_URL,
+            secret_token=config.WEBHOOK_SECRET,
+            max_in_flight=config.WEBHOOK_MAX_IN_FLIGHT,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=False
+        ))
+    else:
+        # Апдейты, пришедшие во время рестарта, не выбрасываем: диалоги
+        # восстановлены из сессий, и нажатая кнопка продолжит заказ
+        application.run_polling(
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=False
+        )
 
 if __name__ == '__main__':
     try:
@@ -9,5 +9,44 @@ ADMIN_ID_2 = 1477864632  # Второй админ
 ADMIN_IDS = [1063802362, 1477864632]  # Список всех админов
 CONTACT_USERNAME = "aliswesh"
 
+# Хранилище данных: "yaml" (файлы в data/) или "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "yaml")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/bot.sqlite3")
+
+# Сколько апдейтов обрабатывается одновременно (апдейты одного пользователя - по очереди)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+# Режим получения апдейтов: "polling" или "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес; без него setWebhook не вызывается
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))
+
+# Лимиты исходящих запросов к Bot API (OUTBOUND_RATE=0 - без очереди)
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "30"))  # запросов в секунду на весь бот
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # в секунду на личный чат
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", "10"))  # подряд в личный чат
+
+# Рассылки: одновременных отправок и сообщений в секунду (остальное - покупателям)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "4"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+
+# Уведомления админам о заказах копятся столько секунд и уходят одной сводкой
+ADMIN_NOTIFY_WINDOW = float(os.getenv("ADMIN_NOTIFY_WINDOW", "10"))
+
+# Незаконченные заказы и диалоги сохраняются на диск раз в столько секунд (и при остановке)
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "10"))
+
+# Метрики Prometheus на http://METRICS_LISTEN:METRICS_PORT/metrics (без порта - выключены)
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден!")
+
+# Без секрета любой, кто знает путь webhook, мог бы подделать апдейт от админа
+if RUN_MODE == 'webhook' and not WEBHOOK_SECRET:
+    raise ValueError("WEBHOOK_SECRET не задан - в режиме webhook он обязателен!")
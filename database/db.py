@@ -1,9 +1,50 @@
 import yaml
 import os
-from datetime import datetime
+import json
+import asyncio
+import copy
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from config import ADMIN_IDS, STORAGE_BACKEND
+from . import ids
 
 DATA_DIR = "data"
 
+# Разбор через libyaml в разы быстрее чистого Python - это почти всё
+# время холодного старта на больших orders.yaml и users.yaml
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+logger = logging.getLogger(__name__)
+
+# Кэш разобранных YAML-файлов: путь -> (mtime_ns, size, data).
+# Запись идёт сквозь кэш, а перечитывание с диска происходит только
+# если файл изменился снаружи (например, его поправили руками).
+# Документ в кэше не меняется никогда: писатели правят копию
+# (_load_for_write), и она попадает в кэш только после удачной записи,
+# поэтому читатели из других потоков не видят незаписанных изменений.
+_cache = {}
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'writes': 0}
+
+# Подписчики на чтение/запись файлов: hook(op, filename, nbytes, seconds).
+# Без подписчиков (метрики выключены) лишней работы нет.
+_io_hooks = []
+
+def add_io_hook(hook):
+    _io_hooks.append(hook)
+
+def _report_io(op, filename, nbytes, started):
+    elapsed = time.perf_counter() - started
+    for hook in _io_hooks:
+        hook(op, filename, nbytes, elapsed)
+
 def _ensure_file(filename, default):
     filepath = os.path.join(DATA_DIR, filename)
     if not os.path.exists(filepath):
@@ -11,31 +52,299 @@ def _ensure_file(filename, default):
         with open(filepath, 'w', encoding='utf-8') as f:
             yaml.dump(default, f, allow_unicode=True)
 
+def _stat(filepath):
+    st = os.stat(filepath)
+    return st.st_mtime_ns, st.st_size
+
 def load_yaml(filename):
+    started = time.perf_counter()
     filepath = os.path.join(DATA_DIR, filename)
-    _ensure_file(filename, {})
+    try:
+        mtime, size = _stat(filepath)
+    except FileNotFoundError:
+        _ensure_file(filename, {})
+        mtime, size = _stat(filepath)
+    
+    with _cache_lock:
+        entry = _cache.get(filepath)
+        if entry is not None and entry[0] == mtime and entry[1] == size:
+            _cache_stats['hits'] += 1
+            hit = entry[2]
+        else:
+            hit = None
+            _cache_stats['misses' if entry is None else 'reloads'] += 1
+    if hit is not None:
+        if _io_hooks:
+            _report_io('load_cached', filename, 0, started)
+        return hit
+    
     with open(filepath, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f) or {}
+        data = yaml.load(f, Loader=_YamlLoader) or {}
+    
+    with _cache_lock:
+        _cache[filepath] = (mtime, size, data)
+    if _io_hooks:
+        _report_io('load', filename, size, started)
+    return data
+
+def _load_for_write(filename):
+    """Копия документа для изменения и последующего save_yaml"""
+    return copy.deepcopy(load_yaml(filename))
+
+def _dump_yaml(filename, data, suffix='.tmp'):
+    """Записать data во временный файл рядом с filename, вернуть его путь"""
+    tmp_path = os.path.join(DATA_DIR, filename) + suffix
+    os.makedirs(DATA_DIR, exist_ok=True)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            yaml.dump(data, f, allow_unicode=True)
+    except Exception:
+        _discard(tmp_path)
+        raise
+    return tmp_path
+
+def _discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+def _publish_yaml(filename, tmp_path, data, started):
+    """Атомарно подменить filename записанным файлом и положить data в кэш"""
+    filepath = os.path.join(DATA_DIR, filename)
+    try:
+        os.replace(tmp_path, filepath)
+    except Exception:
+        # Файл не подменён - в кэше остаётся прежний, всё ещё верный документ
+        _discard(tmp_path)
+        raise
+    
+    mtime, size = _stat(filepath)
+    with _cache_lock:
+        _cache[filepath] = (mtime, size, data)
+        _cache_stats['writes'] += 1
+    if _io_hooks:
+        _report_io('save', filename, size, started)
 
 def save_yaml(filename, data):
+    # Пишем во временный файл и атомарно подменяем, чтобы падение
+    # посреди записи не оставило обрезанный YAML
+    started = time.perf_counter()
+    _publish_yaml(filename, _dump_yaml(filename, data), data, started)
+
+def get_cache_stats():
+    """Счетчики попаданий/промахов кэша YAML-файлов"""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats['files'] = len(_cache)
+    lookups = stats['hits'] + stats['misses'] + stats['reloads']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+def clear_cache():
+    """Сбросить кэш и счетчики (например, после подмены DATA_DIR)"""
+    with _cache_lock:
+        _cache.clear()
+        for key in _cache_stats:
+            _cache_stats[key] = 0
+
+# Журналы (одна JSON-запись на строку): путь -> {'offset', 'records'}.
+# Читаются инкрементально - с диска берётся только дописанный хвост.
+_journals = {}
+_journal_lock = threading.RLock()
+
+def append_journal(filename, record):
+    """Дописать запись в конец журнала"""
     filepath = os.path.join(DATA_DIR, filename)
     os.makedirs(DATA_DIR, exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, allow_unicode=True)
+    started = time.perf_counter()
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _journal_lock:
+        with open(filepath, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+    if _io_hooks:
+        _report_io('append', filename, len(line.encode('utf-8')), started)
+
+def read_journal(filename):
+    """Все целые записи журнала (общий список - не изменять)"""
+    filepath = os.path.join(DATA_DIR, filename)
+    with _journal_lock:
+        state = _journals.get(filepath)
+        if state is None:
+            state = _journals[filepath] = {'offset': 0, 'records': []}
+        
+        try:
+            size = os.path.getsize(filepath)
+        except FileNotFoundError:
+            size = 0
+        
+        if size < state['offset']:
+            # Журнал сжали или заменили - читаем заново
+            state['offset'] = 0
+            state['records'] = []
+        
+        if size > state['offset']:
+            started = time.perf_counter()
+            with open(filepath, 'rb') as f:
+                f.seek(state['offset'])
+                chunk = f.read(size - state['offset'])
+            
+            # Недописанную последнюю строку (падение во время записи) пропускаем
+            end = chunk.rfind(b'\n') + 1
+            records = []
+            for raw in chunk[:end].splitlines():
+                if not raw.strip():
+                    continue
+                try:
+                    records.append(json.loads(raw))
+                except ValueError:
+                    logger.warning(f"Битая запись в {filename}: {raw[:80]!r}")
+            state['records'].extend(records)
+            state['offset'] += end
+            if _io_hooks:
+                _report_io('read_journal', filename, len(chunk), started)
+        
+        return state['records']
+
+def truncate_journal(filename):
+    filepath = os.path.join(DATA_DIR, filename)
+    with _journal_lock:
+        with open(filepath, 'w', encoding='utf-8'):
+            pass
+        _journals.pop(filepath, None)
+
+def _trim_journal(filename, last_seq):
+    """Оставить в журнале только записи с seq больше last_seq"""
+    filepath = os.path.join(DATA_DIR, filename)
+    tmp_path = filepath + '.tmp'
+    with _journal_lock:
+        records = [r for r in read_journal(filename) if r['seq'] > last_seq]
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        _journals.pop(filepath, None)
+    return len(records)
+
+# Блокировки на запись по файлам: запись одного файла не ждёт другие
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def _file_lock(filename):
+    with _file_locks_guard:
+        lock = _file_locks.get(filename)
+        if lock is None:
+            lock = _file_locks[filename] = threading.RLock()
+        return lock
+
+def _writes(filename):
+    """Выполнять функцию под блокировкой файла filename"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _file_lock(filename):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Сжатие журнала в снимок. Долгая часть - yaml.dump всего документа -
+# идёт вне блокировки файла, писатели её не ждут; под блокировкой лишь
+# подменяется файл, а из журнала убираются записи, вошедшие в снимок.
+# Повторное сжатие во время идущего пропускается.
+_compacting = set()
+_compacting_guard = threading.Lock()
+
+def _compact(filename, journal, load, build):
+    """load() - вид файла в памяти, build(view) - новый снимок (только копия
+    ссылок, без разбора: строится под блокировкой)"""
+    started = time.perf_counter()
+    with _file_lock(filename):
+        view = load()
+        if not view['seen']:
+            return False
+        base = view['snapshot']
+        snapshot = build(view)
+    
+    tmp_path = _dump_yaml(filename, snapshot, '.compact.tmp')
+    with _file_lock(filename):
+        view = load()
+        if view['snapshot'] is not base:
+            # Снимок успели заменить (перенумерация, правка руками) - наш устарел
+            _discard(tmp_path)
+            return False
+        _publish_yaml(filename, tmp_path, snapshot, started)
+        # Всё, что дописано во время записи, уже учтено в виде - остаётся в журнале
+        view['seen'] = _trim_journal(journal, snapshot['last_seq'])
+        view['snapshot'] = snapshot
+    return True
+
+def _compact_in_background(compact):
+    with _compacting_guard:
+        if compact in _compacting:
+            return
+        _compacting.add(compact)
+    
+    def run():
+        try:
+            compact()
+        except Exception as e:
+            logger.error(f"❌ Ошибка сжатия журнала ({compact.__name__}): {e}")
+        finally:
+            with _compacting_guard:
+                _compacting.discard(compact)
+    
+    threading.Thread(target=run, name=compact.__name__, daemon=True).start()
+
+@contextmanager
+def batch_update(filename):
+    """Изменить документ несколькими операциями и записать файл один раз"""
+    with _file_lock(filename):
+        # При ошибке копия просто выбрасывается - кэш не тронут
+        data = _load_for_write(filename)
+        yield data
+        save_yaml(filename, data)
+
+# Подписчики на изменения каталога: hook(bouquet_ids), None - изменилось всё
+# (например, bouquets.yaml поправили руками). Нужны кэшам отрисовки.
+_bouquet_hooks = []
+_bouquets_doc = {'doc': None}
+
+def add_bouquet_hook(hook):
+    _bouquet_hooks.append(hook)
+
+def notify_bouquets_changed(bouquet_ids=None):
+    for hook in _bouquet_hooks:
+        hook(bouquet_ids)
 
 def get_bouquets():
     data = load_yaml('bouquets.yaml')
-    return data.get('bouquets', [])
+    if data is not _bouquets_doc['doc']:
+        # Файл перечитан с диска - прежние данные букетов могли устареть
+        if _bouquets_doc['doc'] is not None:
+            notify_bouquets_changed(None)
+        _bouquets_doc['doc'] = data
+    return list(data.get('bouquets', []))
 
 def get_bouquet_by_id(bouquet_id):
     bouquets = get_bouquets()
     for b in bouquets:
         if b['id'] == bouquet_id:
-            return b
+            # Копия: вызывающий код кладёт букет в user_data и может его менять
+            return copy.deepcopy(b)
     return None
 
+def _save_bouquets(data):
+    # Свою запись get_bouquets не должен принять за правку файла руками
+    _bouquets_doc['doc'] = data
+    save_yaml('bouquets.yaml', data)
+
+@_writes('bouquets.yaml')
 def save_bouquet(bouquet):
-    data = load_yaml('bouquets.yaml')
+    data = _load_for_write('bouquets.yaml')
     if 'bouquets' not in data:
         data['bouquets'] = []
     
@@ -51,176 +360,568 @@ def save_bouquet(bouquet):
     bouquet['id'] = f"b{max_id + 1}"
     bouquet['order_count'] = 0  # Счетчик заказов
     data['bouquets'].append(bouquet)
-    save_yaml('bouquets.yaml', data)
+    _save_bouquets(data)
+    # Меняется число букетов, а с ним и кнопки листания у всех
+    notify_bouquets_changed(None)
     return bouquet['id']
 
 def update_bouquet(bouquet_id, updates):
-    data = load_yaml('bouquets.yaml')
-    bouquets = data.get('bouquets', [])
-    
-    for i, b in enumerate(bouquets):
-        if b['id'] == bouquet_id:
-            bouquets[i].update(updates)
-            break
-    
-    data['bouquets'] = bouquets
-    save_yaml('bouquets.yaml', data)
+    update_bouquets({bouquet_id: updates})
 
+def update_bouquets(updates):
+    """Обновить несколько букетов одной записью: {bouquet_id: {поле: значение}}"""
+    with batch_update('bouquets.yaml') as data:
+        for b in data.get('bouquets', []):
+            if b['id'] in updates:
+                b.update(updates[b['id']])
+        _bouquets_doc['doc'] = data
+    notify_bouquets_changed(list(updates))
+
+@_writes('bouquets.yaml')
 def delete_bouquet(bouquet_id):
-    data = load_yaml('bouquets.yaml')
+    data = _load_for_write('bouquets.yaml')
     bouquets = [b for b in data.get('bouquets', []) if b['id'] != bouquet_id]
     data['bouquets'] = bouquets
-    save_yaml('bouquets.yaml', data)
+    _save_bouquets(data)
+    notify_bouquets_changed(None)
 
-def increment_bouquet_orders(bouquet_id):
+def increment_bouquet_orders(bouquet_id, count=1):
     """Увеличить счетчик заказов и автоматически установить популярность"""
-    data = load_yaml('bouquets.yaml')
-    bouquets = data.get('bouquets', [])
-    
-    for i, b in enumerate(bouquets):
-        if b['id'] == bouquet_id:
-            bouquets[i]['order_count'] = bouquets[i].get('order_count', 0) + 1
-            # Автопопулярность: если >= 10 заказов
-            if bouquets[i]['order_count'] >= 10:
-                bouquets[i]['is_popular'] = True
-            break
-    
-    data['bouquets'] = bouquets
-    save_yaml('bouquets.yaml', data)
+    increment_bouquets_orders({bouquet_id: count})
+
+def increment_bouquets_orders(counts):
+    """Увеличить счетчики заказов нескольких букетов одной записью: {bouquet_id: сколько}"""
+    with batch_update('bouquets.yaml') as data:
+        for b in data.get('bouquets', []):
+            count = counts.get(b['id'])
+            if count:
+                _add_order_count(b, count)
+        _bouquets_doc['doc'] = data
+    notify_bouquets_changed(list(counts))
+
+def _add_order_count(bouquet, count):
+    bouquet['order_count'] = bouquet.get('order_count', 0) + count
+    # Автопопулярность: если >= 10 заказов
+    if bouquet['order_count'] >= 10:
+        bouquet['is_popular'] = True
 
 def get_user_cart(user_id):
     data = load_yaml('carts.yaml')
     carts = data.get('carts', {})
-    return carts.get(str(user_id), [])
+    # Копия: список в кэше может меняться писателем из другого потока
+    return list(carts.get(str(user_id), []))
+
+def _copy_user_list(doc, section, user_key):
+    """Копия документа для правки списка одного пользователя: новые только
+    сам документ, его раздел и этот список - остальное общее с кэшем"""
+    data = dict(doc)
+    data[section] = dict(data.get(section) or {})
+    user_list = data[section][user_key] = list(data[section].get(user_key, []))
+    return data, user_list
 
+@_writes('carts.yaml')
 def add_to_cart(user_id, item):
-    data = load_yaml('carts.yaml')
-    if 'carts' not in data:
-        data['carts'] = {}
-    
-    user_key = str(user_id)
-    if user_key not in data['carts']:
-        data['carts'][user_key] = []
-    
-    data['carts'][user_key].append(item)
+    data, cart = _copy_user_list(load_yaml('carts.yaml'), 'carts', str(user_id))
+    cart.append(item)
     save_yaml('carts.yaml', data)
 
+@_writes('carts.yaml')
 def remove_from_cart(user_id, index):
-    data = load_yaml('carts.yaml')
-    carts = data.get('carts', {})
-    user_key = str(user_id)
-    
-    if user_key in carts and 0 <= index < len(carts[user_key]):
-        carts[user_key].pop(index)
-        data['carts'] = carts
+    data, cart = _copy_user_list(load_yaml('carts.yaml'), 'carts', str(user_id))
+    if 0 <= index < len(cart):
+        cart.pop(index)
         save_yaml('carts.yaml', data)
 
+@_writes('carts.yaml')
 def clear_cart(user_id):
-    data = load_yaml('carts.yaml')
-    carts = data.get('carts', {})
-    carts[str(user_id)] = []
-    data['carts'] = carts
+    data, cart = _copy_user_list(load_yaml('carts.yaml'), 'carts', str(user_id))
+    cart.clear()
     save_yaml('carts.yaml', data)
 
 def get_favorites(user_id):
     data = load_yaml('favorites.yaml')
     favs = data.get('favorites', {})
-    return favs.get(str(user_id), [])
+    return list(favs.get(str(user_id), []))
 
-def toggle_favorite(user_id, bouquet_id):
+# Множества избранного для проверок "букет в избранном?" без прохода по списку
+_favorite_sets = {'doc': None, 'sets': {}}
+
+def get_favorite_set(user_id):
     data = load_yaml('favorites.yaml')
-    if 'favorites' not in data:
-        data['favorites'] = {}
-    
     user_key = str(user_id)
-    if user_key not in data['favorites']:
-        data['favorites'][user_key] = []
+    with _file_lock('favorites.yaml'):
+        if _favorite_sets['doc'] is not data:
+            _favorite_sets['doc'] = data
+            _favorite_sets['sets'] = {}
+        
+        favs = _favorite_sets['sets'].get(user_key)
+        if favs is None:
+            favs = frozenset(data.get('favorites', {}).get(user_key, []))
+            _favorite_sets['sets'][user_key] = favs
+        return favs
+
+@_writes('favorites.yaml')
+def toggle_favorite(user_id, bouquet_id):
+    current = load_yaml('favorites.yaml')
+    user_key = str(user_id)
+    data, favs = _copy_user_list(current, 'favorites', user_key)
     
-    if bouquet_id in data['favorites'][user_key]:
-        data['favorites'][user_key].remove(bouquet_id)
+    if bouquet_id in favs:
+        favs.remove(bouquet_id)
     else:
-        data['favorites'][user_key].append(bouquet_id)
+        favs.append(bouquet_id)
     
     save_yaml('favorites.yaml', data)
+    # Множества остальных пользователей новой записью не затронуты
+    if _favorite_sets['doc'] is current:
+        _favorite_sets['doc'] = data
+    _favorite_sets['sets'].pop(user_key, None)
 
-def create_order(user_id, user_name, items):
-    data = load_yaml('orders.yaml')
-    if 'orders' not in data:
-        data['orders'] = []
+# Заказы: снимок orders.yaml + журнал orders.jsonl с новыми заказами.
+# Каждая запись журнала имеет порядковый номер seq, а снимок помнит
+# last_seq - так повторное сжатие после падения не задвоит заказы.
+ORDERS_FILE = 'orders.yaml'
+ORDERS_JOURNAL = 'orders.jsonl'
+ORDERS_COMPACT_EVERY = 500
+
+# Вид на заказы в памяти вместе со вторичными индексами:
+# by_user - позиции заказов пользователя (по возрастанию, новые в конце),
+# by_status - позиции заказов с этим статусом (так же),
+# by_id - позиция заказа по order_id (и по старому номеру, если заказ перенумерован),
+# а также агрегаты статистики: revenue и days (дата -> {'orders', 'revenue'})
+_orders_view = {
+    'snapshot': None, 'seen': 0, 'orders': [], 'last_seq': 0,
+    'by_user': {}, 'by_status': {}, 'by_id': {}, 'revenue': 0, 'days': {}
+}
+
+def _index_order(view, order):
+    position = len(view['orders'])
+    view['orders'].append(order)
+    view['by_user'].setdefault(order['user_id'], []).append(position)
+    view['by_status'].setdefault(order.get('status', 'pending'), []).append(position)
+    view['by_id'][order['order_id']] = position
+    if order.get('legacy_id'):
+        # Старые номера могли совпадать - по такому находится первый заказ
+        view['by_id'].setdefault(order['legacy_id'], position)
+    # created_at в ISO-формате: первые 10 символов - дата
+    bucket = view['days'].setdefault(order['created_at'][:10], {'orders': 0, 'revenue': 0})
+    bucket['orders'] += 1
+    bucket['revenue'] += order.get('total_price', 0)
+    view['revenue'] += order.get('total_price', 0)
+
+def _load_orders():
+    with _file_lock(ORDERS_FILE):
+        snapshot = load_yaml(ORDERS_FILE)
+        records = read_journal(ORDERS_JOURNAL)
+        view = _orders_view
+        
+        if view['snapshot'] is not snapshot or len(records) < view['seen']:
+            view['snapshot'] = snapshot
+            view['seen'] = 0
+            view['orders'] = []
+            view['by_user'] = {}
+            view['by_status'] = {}
+            view['by_id'] = {}
+            view['revenue'] = 0
+            view['days'] = {}
+            view['last_seq'] = snapshot.get('last_seq', 0)
+            for order in snapshot.get('orders', []):
+                _index_order(view, order)
+        
+        for record in records[view['seen']:]:
+            if record['seq'] > view['last_seq']:
+                _index_order(view, record['data'])
+                view['last_seq'] = record['seq']
+        view['seen'] = len(records)
+        
+        return view
+
+def compact_orders():
+    """Перенести журнал заказов в снимок orders.yaml"""
+    return _compact(
+        ORDERS_FILE, ORDERS_JOURNAL, _load_orders,
+        lambda view: {'orders': list(view['orders']), 'last_seq': view['last_seq']}
+    )
+
+def rekey_orders():
+    """Однократно перевести старые номера заказов (order_<секунды>, могли
+    совпадать) в формат ids.new_order_id; возвращает число перенумерованных"""
+    with _file_lock(ORDERS_FILE):
+        view = _load_orders()
+        if all(ids.is_order_id(order['order_id']) for order in view['orders']):
+            return 0
+        
+        orders = []
+        count = 0
+        for position, order in enumerate(view['orders']):
+            if not ids.is_order_id(order['order_id']):
+                order = ids.rekeyed(order, position)
+                count += 1
+            orders.append(order)
+        # Журнал уходит в тот же снимок - записи с новыми номерами в одном месте
+        save_yaml(ORDERS_FILE, {'orders': orders, 'last_seq': view['last_seq']})
+        truncate_journal(ORDERS_JOURNAL)
+        view['snapshot'] = None
+        _load_orders()
     
+    logger.info(f"Перенумеровано заказов: {count}")
+    return count
+
+def create_order(user_id, user_name, items):
     order = {
-        'order_id': f"order_{int(datetime.now().timestamp())}",
         'user_id': user_id,
         'user_name': user_name,
-        'created_at': datetime.now().isoformat(),
         'items': items,
         'total_price': sum(item.get('total_price', 0) for item in items),
         'status': 'pending'
     }
     
-    data['orders'].append(order)
-    save_yaml('orders.yaml', data)
+    with _file_lock(ORDERS_FILE):
+        view = _load_orders()
+        # Номер и время - под блокировкой: порядок в журнале совпадает с
+        # порядком номеров и created_at, на этом стоит бинарный поиск в
+        # get_orders_page. Время не идёт назад, даже если отстали часы.
+        created_at = datetime.now().isoformat()
+        if view['orders'] and view['orders'][-1]['created_at'] > created_at:
+            created_at = view['orders'][-1]['created_at']
+        order['order_id'] = ids.new_order_id()
+        order['created_at'] = created_at
+        append_journal(ORDERS_JOURNAL, {'seq': view['last_seq'] + 1, 'data': order})
+        if view['seen'] + 1 >= ORDERS_COMPACT_EVERY:
+            _compact_in_background(compact_orders)
     
-    # Увеличиваем счетчик заказов для каждого букета
-    for item in items:
-        increment_bouquet_orders(item['bouquet_id'])
+    # Счетчики всех букетов заказа обновляются одной записью каталога
+    increment_bouquets_orders(Counter(item['bouquet_id'] for item in items))
     
     return order['order_id']
 
-def get_user_orders(user_id):
-    data = load_yaml('orders.yaml')
-    orders = data.get('orders', [])
-    return [o for o in orders if o['user_id'] == user_id]
+def get_user_orders(user_id, limit=None):
+    """Заказы пользователя по порядку создания; limit - только последние N"""
+    view = _load_orders()
+    positions = view['by_user'].get(user_id, [])
+    if limit is not None:
+        positions = positions[-limit:] if limit > 0 else []
+    return [view['orders'][i] for i in positions]
+
+def get_order(order_id):
+    """Заказ по номеру (новому или старому) или None"""
+    view = _load_orders()
+    position = view['by_id'].get(order_id)
+    return view['orders'][position] if position is not None else None
+
+def _bisect_created(orders, positions, value, lo, hi):
+    """Первый индекс в positions[lo:hi], чей заказ создан не раньше value"""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if orders[positions[mid]]['created_at'] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def _page_cursors(page, has_more, before, after):
+    """Курсоры соседних страниц: номера крайних заказов или None"""
+    if not page:
+        return {'orders': page, 'older': None, 'newer': None}
+    return {
+        'orders': page,
+        'older': page[-1]['order_id'] if (has_more if after is None else True) else None,
+        'newer': page[0]['order_id'] if (has_more if after is not None else before is not None) else None
+    }
+
+def get_orders_page(limit=10, before=None, after=None, status=None, user_id=None, date_from=None, date_to=None):
+    """Страница заказов, новые первыми.
+
+    before/after - номер заказа-курсора: страница старше или новее его
+    (без курсора - самые новые). date_from/date_to - 'YYYY-MM-DD' включительно.
+    Возвращает {'orders', 'older', 'newer'}, где older/newer - курсоры
+    соседних страниц или None. Читаются только заказы этой страницы.
+    """
+    view = _load_orders()
+    orders = view['orders']
+    # Кандидаты - позиции по возрастанию из самого узкого индекса
+    if user_id is not None:
+        positions = view['by_user'].get(user_id, [])
+    elif status is not None:
+        positions = view['by_status'].get(status, [])
+    else:
+        positions = range(len(orders))
+    
+    # Заказы лежат по времени создания - период и курсор находятся бинарным поиском
+    lo, hi = 0, len(positions)
+    if date_from:
+        lo = _bisect_created(orders, positions, date_from, lo, hi)
+    if date_to:
+        next_day = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+        hi = _bisect_created(orders, positions, next_day, lo, hi)
+    
+    def matches(order):
+        return (status is None or order.get('status', 'pending') == status) and \
+            (user_id is None or order['user_id'] == user_id)
+    
+    page = []
+    if after is not None and after in view['by_id']:
+        i = max(lo, bisect_right(positions, view['by_id'][after]))
+        while i < hi and len(page) <= limit:
+            if matches(orders[positions[i]]):
+                page.append(orders[positions[i]])
+            i += 1
+        has_more = len(page) > limit
+        page = page[:limit][::-1]
+    else:
+        after = None
+        if before is not None and before in view['by_id']:
+            i = min(hi, bisect_left(positions, view['by_id'][before])) - 1
+        else:
+            before = None
+            i = hi - 1
+        while i >= lo and len(page) <= limit:
+            if matches(orders[positions[i]]):
+                page.append(orders[positions[i]])
+            i -= 1
+        has_more = len(page) > limit
+        page = page[:limit]
+    
+    return _page_cursors(page, has_more, before, after)
 
 def get_all_orders():
-    data = load_yaml('orders.yaml')
-    return data.get('orders', [])
+    return list(_load_orders()['orders'])
 
+# Админы - из config.ADMIN_IDS и admins.yaml (так же в SQLite)
 def is_admin(user_id):
-    data = load_yaml('admins.yaml')
-    admins = data.get('admins', [])
-    return user_id in admins
+    return user_id in ADMIN_IDS or user_id in load_yaml('admins.yaml').get('admins', [])
+
+def get_admin_ids():
+    return list(dict.fromkeys([*ADMIN_IDS, *load_yaml('admins.yaml').get('admins', [])]))
+
+# Реестр пользователей: снимок users.yaml + журнал users.jsonl.
+# Новые пользователи дописываются в журнал, повторный /start проверяется
+# по словарю в памяти и диск не трогает. Время последнего визита копится
+# в памяти и сбрасывается в журнал одной записью (flush_users вызывается
+# из bot.py раз в USERS_FLUSH_INTERVAL секунд и при остановке).
+USERS_FILE = 'users.yaml'
+USERS_JOURNAL = 'users.jsonl'
+USERS_COMPACT_EVERY = 1000
+USERS_FLUSH_INTERVAL = 60
+
+_users_view = {'snapshot': None, 'seen': 0, 'users': {}, 'last_seq': 0}
+_last_seen = {}
+
+def _apply_user_record(users, record):
+    op = record.get('op', 'add')
+    if op == 'add':
+        users.setdefault(record['data']['user_id'], record['data'])
+    elif op == 'seen':
+        for user_id, seen_at in record['data'].items():
+            user = users.get(int(user_id))
+            if user:
+                # Новый словарь, а не правка на месте: старый может лежать
+                # в снимке, который сейчас пишется на диск
+                users[int(user_id)] = dict(user, last_seen=seen_at)
+    elif op == 'delete':
+        users.pop(record['data']['user_id'], None)
+
+def _load_users():
+    with _file_lock(USERS_FILE):
+        snapshot = load_yaml(USERS_FILE)
+        records = read_journal(USERS_JOURNAL)
+        view = _users_view
+        
+        if view['snapshot'] is not snapshot or len(records) < view['seen']:
+            view['snapshot'] = snapshot
+            view['seen'] = 0
+            view['users'] = {u['user_id']: u for u in snapshot.get('users', [])}
+            view['last_seq'] = snapshot.get('last_seq', 0)
+        
+        for record in records[view['seen']:]:
+            if record['seq'] > view['last_seq']:
+                _apply_user_record(view['users'], record)
+                view['last_seq'] = record['seq']
+        view['seen'] = len(records)
+        
+        return view
+
+def _users():
+    """Реестр в памяти; с диска читается только при первом обращении"""
+    view = _users_view
+    if view['snapshot'] is None:
+        view = _load_users()
+    return view['users']
+
+def _append_user_record(op, data):
+    view = _load_users()
+    record = {'seq': view['last_seq'] + 1, 'op': op, 'data': data}
+    append_journal(USERS_JOURNAL, record)
+    _load_users()
+    if view['seen'] >= USERS_COMPACT_EVERY:
+        _compact_in_background(compact_users)
+
+def compact_users():
+    """Перенести журнал пользователей в снимок users.yaml"""
+    return _compact(
+        USERS_FILE, USERS_JOURNAL, _load_users,
+        lambda view: {'users': list(view['users'].values()), 'last_seq': view['last_seq']}
+    )
 
 def save_user(user_id, username, first_name, last_name=""):
-    data = load_yaml('users.yaml')
-    if 'users' not in data:
-        data['users'] = []
+    touch_user(user_id)
+    if user_id in _users():
+        return
     
-    for u in data['users']:
-        if u['user_id'] == user_id:
+    with _file_lock(USERS_FILE):
+        if user_id in _load_users()['users']:
             return
+        
+        user = {
+            'user_id': user_id,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'registered_at': datetime.now().isoformat()
+        }
+        _append_user_record('add', user)
+
+def touch_user(user_id):
+    """Отметить визит пользователя (только в памяти, на диск - в flush_users)"""
+    _last_seen[user_id] = datetime.now().isoformat()
+
+def flush_users():
+    """Записать накопленные визиты одной записью журнала"""
+    with _file_lock(USERS_FILE):
+        users = _load_users()['users']
+        batch = {}
+        while _last_seen:
+            user_id, seen_at = _last_seen.popitem()
+            if user_id in users:
+                batch[str(user_id)] = seen_at
+        if batch:
+            _append_user_record('seen', batch)
+        return len(batch)
+
+def delete_user(user_id):
+    """Убрать пользователя из реестра (например, заблокировал бота)"""
+    _last_seen.pop(user_id, None)
+    with _file_lock(USERS_FILE):
+        if user_id not in _load_users()['users']:
+            return False
+        _append_user_record('delete', {'user_id': user_id})
     
-    user = {
-        'user_id': user_id,
-        'username': username,
-        'first_name': first_name,
-        'last_name': last_name,
-        'registered_at': datetime.now().isoformat()
-    }
-    
-    data['users'].append(user)
-    save_yaml('users.yaml', data)
+    return True
+
+def get_users():
+    """Все зарегистрированные пользователи по порядку регистрации"""
+    return list(_users().values())
+
+# Агрегаты для статистики: итоги и корзины по дням. Их ведёт вид на
+# заказы (_index_order) - новый заказ учитывается своей записью журнала,
+# а при перечитывании снимка (в том числе после правки руками) всё
+# считается заново. На диск агрегаты не пишутся: при старте снимок заказов
+# всё равно разбирается целиком ради индексов, а пересчёт итогов поверх
+# этого разбора - доли процента времени загрузки.
 
 def get_stats():
-    orders = get_all_orders()
-    bouquets = get_bouquets()
-    users_data = load_yaml('users.yaml')
-    
-    total_orders = len(orders)
-    total_revenue = sum(o['total_price'] for o in orders)
-    total_users = len(users_data.get('users', []))
-    total_bouquets = len(bouquets)
-    
-    today = datetime.now().date()
-    today_orders = [o for o in orders if datetime.fromisoformat(o['created_at']).date() == today]
-    today_count = len(today_orders)
-    today_revenue = sum(o['total_price'] for o in today_orders)
+    with _file_lock(ORDERS_FILE):
+        view = _load_orders()
+        today = view['days'].get(datetime.now().date().isoformat(), {})
+        total_orders = len(view['orders'])
+        total_revenue = view['revenue']
     
     return {
         'total_orders': total_orders,
         'total_revenue': total_revenue,
-        'total_users': total_users,
-        'total_bouquets': total_bouquets,
-        'today_orders': today_count,
-        'today_revenue': today_revenue
+        'total_users': len(_users()),
+        'total_bouquets': len(get_bouquets()),
+        'today_orders': today.get('orders', 0),
+        'today_revenue': today.get('revenue', 0)
     }
+
+def warm_up():
+    """Загрузить данные и построить индексы заранее, до первых запросов"""
+    get_bouquets()
+    load_yaml('carts.yaml')
+    load_yaml('favorites.yaml')
+    _load_orders()
+    rekey_orders()
+    _load_users()
+
+# file_id фотографий, уже загруженных в Telegram: повторная отправка
+# по file_id не требует заливать файл заново. Ключ - id букета, а хэш
+# содержимого картинки страхует от подмены файла на диске.
+def get_photo_file_id(bouquet_id, image_hash):
+    data = load_yaml('file_ids.yaml')
+    entry = data.get('file_ids', {}).get(bouquet_id)
+    if entry and entry.get('hash') == image_hash:
+        return entry['file_id']
+    return None
+
+@_writes('file_ids.yaml')
+def set_photo_file_id(bouquet_id, image_hash, file_id):
+    data = _load_for_write('file_ids.yaml')
+    if 'file_ids' not in data:
+        data['file_ids'] = {}
+    
+    data['file_ids'][bouquet_id] = {'hash': image_hash, 'file_id': file_id}
+    save_yaml('file_ids.yaml', data)
+
+@_writes('file_ids.yaml')
+def forget_photo_file_id(bouquet_id):
+    data = _load_for_write('file_ids.yaml')
+    if data.get('file_ids', {}).pop(bouquet_id, None) is not None:
+        save_yaml('file_ids.yaml', data)
+
+# Хранилище выбирается в config.py; вызывающий код везде использует db.*
+if STORAGE_BACKEND == 'sqlite':
+    from .sqlite_backend import (
+        get_bouquets, get_bouquet_by_id, save_bouquet, update_bouquet, update_bouquets,
+        delete_bouquet, increment_bouquet_orders, increment_bouquets_orders,
+        get_user_cart, add_to_cart, remove_from_cart, clear_cart,
+        get_favorites, get_favorite_set, toggle_favorite,
+        create_order, get_user_orders, get_order, get_orders_page, get_all_orders,
+        is_admin, get_admin_ids, save_user, touch_user, flush_users, delete_user, get_users,
+        get_stats, warm_up,
+        get_photo_file_id, set_photo_file_id, forget_photo_file_id
+    )
+elif STORAGE_BACKEND != 'yaml':
+    raise ValueError(f"Неизвестное хранилище: {STORAGE_BACKEND}")
+
+# Асинхронный фасад: хендлеры вызывают await db.aget_bouquets() и т.п.,
+# а файловый ввод-вывод и разбор YAML идут в ограниченном пуле потоков
+# и не блокируют цикл событий
+DB_WORKERS = 4
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+def _to_async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+aget_bouquets = _to_async(get_bouquets)
+aget_bouquet_by_id = _to_async(get_bouquet_by_id)
+asave_bouquet = _to_async(save_bouquet)
+aupdate_bouquet = _to_async(update_bouquet)
+aupdate_bouquets = _to_async(update_bouquets)
+adelete_bouquet = _to_async(delete_bouquet)
+aget_user_cart = _to_async(get_user_cart)
+aadd_to_cart = _to_async(add_to_cart)
+aremove_from_cart = _to_async(remove_from_cart)
+aclear_cart = _to_async(clear_cart)
+aget_favorites = _to_async(get_favorites)
+aget_favorite_set = _to_async(get_favorite_set)
+atoggle_favorite = _to_async(toggle_favorite)
+acreate_order = _to_async(create_order)
+aget_user_orders = _to_async(get_user_orders)
+aget_order = _to_async(get_order)
+aget_orders_page = _to_async(get_orders_page)
+aget_all_orders = _to_async(get_all_orders)
+ais_admin = _to_async(is_admin)
+aget_admin_ids = _to_async(get_admin_ids)
+asave_user = _to_async(save_user)
+aflush_users = _to_async(flush_users)
+adelete_user = _to_async(delete_user)
+aget_users = _to_async(get_users)
+aget_stats = _to_async(get_stats)
+aget_photo_file_id = _to_async(get_photo_file_id)
+aset_photo_file_id = _to_async(set_photo_file_id)
+aforget_photo_file_id = _to_async(forget_photo_file_id)
@@ -0,0 +1,68 @@
+import os
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+
+# Номера заказов: 20 символов base32 (Crockford) из 100 бит -
+# 48 бит миллисекунд Unix-времени, 32 бита случайного номера процесса
+# и 20 бит счётчика внутри миллисекунды. Строки одной длины, поэтому
+# сортируются по времени создания как обычный текст, а совпасть в
+# разных процессах могут, только если у них совпал случайный номер.
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ID_LENGTH = 20
+SEQ_BITS = 20
+NODE_BITS = 32
+
+ORDER_ID_RE = re.compile(f'^[{ALPHABET}]{{{ID_LENGTH}}}$')
+
+_state = {'node': secrets.randbits(NODE_BITS), 'ms': 0, 'seq': 0}
+_lock = threading.Lock()
+
+def _new_node():
+    # После fork у дочернего процесса должен быть свой номер
+    _state['node'] = secrets.randbits(NODE_BITS)
+    _state['ms'] = 0
+    _state['seq'] = 0
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_new_node)
+
+def _encode(ms, node, seq):
+    value = (ms << (NODE_BITS + SEQ_BITS)) | (node << SEQ_BITS) | seq
+    chars = []
+    for _ in range(ID_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+def new_order_id():
+    """Новый номер заказа: растёт в пределах процесса, даже если часы отстали"""
+    now = time.time_ns() // 1_000_000
+    with _lock:
+        if now > _state['ms']:
+            _state['ms'] = now
+            _state['seq'] = 0
+        else:
+            _state['seq'] += 1
+            if _state['seq'] >> SEQ_BITS:
+                # Счётчик миллисекунды исчерпан - занимаем следующую
+                _state['ms'] += 1
+                _state['seq'] = 0
+        return _encode(_state['ms'], _state['node'], _state['seq'])
+
+def order_id_at(created_at, seq):
+    """Номер для старого заказа по его created_at (ISO-строка); seq различает
+    заказы одной миллисекунды - например, позиция заказа в списке"""
+    ms = int(datetime.fromisoformat(created_at).timestamp() * 1000)
+    return _encode(ms, _state['node'], seq & ((1 << SEQ_BITS) - 1))
+
+def is_order_id(value):
+    return isinstance(value, str) and ORDER_ID_RE.match(value) is not None
+
+def rekeyed(order, seq):
+    """Копия заказа со старым номером (order_<секунды>) в новом формате;
+    прежний номер остаётся в legacy_id - по нему заказ тоже находится"""
+    created_at = order.get('created_at') or datetime.now().isoformat()
+    return dict(order, order_id=order_id_at(created_at, seq), legacy_id=order['order_id'])
@@ -0,0 +1,587 @@
+import sqlite3
+import json
+import os
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from config import ADMIN_IDS, SQLITE_PATH
+from . import ids
+
+DB_PATH = SQLITE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bouquets (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cart_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cart_items_user ON cart_items(user_id, id);
+CREATE TABLE IF NOT EXISTS favorites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    bouquet_id TEXT NOT NULL,
+    UNIQUE (user_id, bouquet_id)
+);
+CREATE INDEX IF NOT EXISTS idx_favorites_bouquet ON favorites(bouquet_id);
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    user_name TEXT,
+    created_at TEXT NOT NULL,
+    total_price INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    items TEXT NOT NULL,
+    legacy_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, seq);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, seq);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    registered_at TEXT NOT NULL,
+    last_seen TEXT
+);
+CREATE TABLE IF NOT EXISTS admins (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS order_stats_daily (
+    day TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trg_orders_stats AFTER INSERT ON orders BEGIN
+    INSERT INTO order_stats_daily (day, orders, revenue)
+    VALUES (substr(NEW.created_at, 1, 10), 1, NEW.total_price)
+    ON CONFLICT(day) DO UPDATE SET orders = orders + 1, revenue = revenue + NEW.total_price;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_count AFTER INSERT ON users BEGIN
+    INSERT INTO counters (name, value) VALUES ('users', 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_uncount AFTER DELETE ON users BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'users';
+END;
+CREATE TABLE IF NOT EXISTS photo_file_ids (
+    bouquet_id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    file_id TEXT NOT NULL
+);
+"""
+
+# Отдельное соединение на поток: sqlite3 не разрешает делить его между потоками
+_local = threading.local()
+
+def _conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DB_PATH:
+        directory = os.path.dirname(DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _upgrade_schema(conn)
+        _backfill_stats(conn)
+        _seed_admins(conn)
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+def _upgrade_schema(conn):
+    """Добавить колонки и индексы, появившиеся после создания базы"""
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+    if 'last_seen' not in columns:
+        with conn:
+            conn.execute("ALTER TABLE users ADD COLUMN last_seen TEXT")
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(orders)")}
+    if 'legacy_id' not in columns:
+        with conn:
+            conn.execute("ALTER TABLE orders ADD COLUMN legacy_id TEXT")
+    # Уникальный индекс по номеру появляется после перенумерации старых
+    # заказов (их номера могли совпадать) - его наличие и есть отметка о ней
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_orders_id'").fetchone():
+        _rekey_orders(conn)
+
+def _rekey_orders(conn):
+    """Однократно перевести старые номера заказов в формат ids.new_order_id"""
+    rows = conn.execute("SELECT seq, order_id, created_at FROM orders ORDER BY seq").fetchall()
+    with conn:
+        for position, row in enumerate(rows):
+            if not ids.is_order_id(row['order_id']):
+                order = ids.rekeyed(dict(row), position)
+                conn.execute(
+                    "UPDATE orders SET order_id = ?, legacy_id = ? WHERE seq = ?",
+                    (order['order_id'], order['legacy_id'], row['seq'])
+                )
+        conn.execute("CREATE UNIQUE INDEX idx_orders_id ON orders(order_id)")
+        conn.execute("CREATE INDEX idx_orders_legacy ON orders(legacy_id) WHERE legacy_id IS NOT NULL")
+
+def _backfill_stats(conn):
+    """Заполнить агрегаты, если база создана до их появления"""
+    with conn:
+        if not conn.execute("SELECT 1 FROM order_stats_daily LIMIT 1").fetchone():
+            conn.execute(
+                "INSERT INTO order_stats_daily (day, orders, revenue) "
+                "SELECT substr(created_at, 1, 10), COUNT(*), SUM(total_price) FROM orders "
+                "GROUP BY substr(created_at, 1, 10)"
+            )
+        if not conn.execute("SELECT 1 FROM counters WHERE name = 'users'").fetchone():
+            conn.execute("INSERT INTO counters (name, value) SELECT 'users', COUNT(*) FROM users")
+
+def _admin_sources():
+    """Админы, которых видит и YAML-хранилище: config.ADMIN_IDS и admins.yaml"""
+    from . import db
+
+    admin_ids = set(ADMIN_IDS)
+    if os.path.exists(os.path.join(db.DATA_DIR, 'admins.yaml')):
+        admin_ids.update(db.load_yaml('admins.yaml').get('admins', []))
+    return admin_ids
+
+def _seed_admins(conn):
+    # Таблицу иначе заполнял бы только migrate_from_yaml
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", [(a,) for a in _admin_sources()])
+
+def _order_from_row(row):
+    order = {
+        'order_id': row['order_id'],
+        'user_id': row['user_id'],
+        'user_name': row['user_name'],
+        'created_at': row['created_at'],
+        'items': json.loads(row['items']),
+        'total_price': row['total_price'],
+        'status': row['status']
+    }
+    if row['legacy_id']:
+        order['legacy_id'] = row['legacy_id']
+    return order
+
+def _bouquets_changed(bouquet_ids=None):
+    # Подписчики живут в db.py - общие для обоих хранилищ
+    from . import db
+    db.notify_bouquets_changed(bouquet_ids)
+
+def get_bouquets():
+    rows = _conn().execute("SELECT data FROM bouquets ORDER BY position").fetchall()
+    return [json.loads(r['data']) for r in rows]
+
+def get_bouquet_by_id(bouquet_id):
+    row = _conn().execute("SELECT data FROM bouquets WHERE id = ?", (bouquet_id,)).fetchone()
+    return json.loads(row['data']) if row else None
+
+def save_bouquet(bouquet):
+    conn = _conn()
+    with conn:
+        max_id = 0
+        for row in conn.execute("SELECT id FROM bouquets"):
+            try:
+                max_id = max(max_id, int(row['id'].replace('b', '')))
+            except ValueError:
+                pass
+
+        position = conn.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM bouquets").fetchone()[0]
+        bouquet['id'] = f"b{max_id + 1}"
+        bouquet['order_count'] = 0  # Счетчик заказов
+        conn.execute(
+            "INSERT INTO bouquets (id, position, data) VALUES (?, ?, ?)",
+            (bouquet['id'], position, json.dumps(bouquet, ensure_ascii=False))
+        )
+    _bouquets_changed(None)
+    return bouquet['id']
+
+def update_bouquet(bouquet_id, updates):
+    update_bouquets({bouquet_id: updates})
+
+def update_bouquets(updates):
+    """Обновить несколько букетов в одной транзакции: {bouquet_id: {поле: значение}}"""
+    conn = _conn()
+    with conn:
+        for bouquet_id, fields in updates.items():
+            row = conn.execute("SELECT data FROM bouquets WHERE id = ?", (bouquet_id,)).fetchone()
+            if not row:
+                continue
+            bouquet = json.loads(row['data'])
+            bouquet.update(fields)
+            conn.execute(
+                "UPDATE bouquets SET data = ? WHERE id = ?",
+                (json.dumps(bouquet, ensure_ascii=False), bouquet_id)
+            )
+    _bouquets_changed(list(updates))
+
+def delete_bouquet(bouquet_id):
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM bouquets WHERE id = ?", (bouquet_id,))
+    _bouquets_changed(None)
+
+def increment_bouquet_orders(bouquet_id, count=1):
+    """Увеличить счетчик заказов и автоматически установить популярность"""
+    increment_bouquets_orders({bouquet_id: count})
+
+def increment_bouquets_orders(counts):
+    """Увеличить счетчики заказов нескольких букетов в одной транзакции"""
+    conn = _conn()
+    with conn:
+        _increment_bouquets_orders(conn, counts)
+    _bouquets_changed(list(counts))
+
+def _increment_bouquets_orders(conn, counts):
+    for bouquet_id, count in counts.items():
+        row = conn.execute("SELECT data FROM bouquets WHERE id = ?", (bouquet_id,)).fetchone()
+        if not row:
+            continue
+        bouquet = json.loads(row['data'])
+        bouquet['order_count'] = bouquet.get('order_count', 0) + count
+        # Автопопулярность: если >= 10 заказов
+        if bouquet['order_count'] >= 10:
+            bouquet['is_popular'] = True
+        conn.execute(
+            "UPDATE bouquets SET data = ? WHERE id = ?",
+            (json.dumps(bouquet, ensure_ascii=False), bouquet_id)
+        )
+
+def get_user_cart(user_id):
+    rows = _conn().execute(
+        "SELECT data FROM cart_items WHERE user_id = ? ORDER BY id", (int(user_id),)
+    ).fetchall()
+    return [json.loads(r['data']) for r in rows]
+
+def add_to_cart(user_id, item):
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO cart_items (user_id, data) VALUES (?, ?)",
+            (int(user_id), json.dumps(item, ensure_ascii=False))
+        )
+
+def remove_from_cart(user_id, index):
+    if index < 0:
+        return
+    conn = _conn()
+    with conn:
+        row = conn.execute(
+            "SELECT id FROM cart_items WHERE user_id = ? ORDER BY id LIMIT 1 OFFSET ?",
+            (int(user_id), index)
+        ).fetchone()
+        if row:
+            conn.execute("DELETE FROM cart_items WHERE id = ?", (row['id'],))
+
+def clear_cart(user_id):
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM cart_items WHERE user_id = ?", (int(user_id),))
+
+def get_favorites(user_id):
+    rows = _conn().execute(
+        "SELECT bouquet_id FROM favorites WHERE user_id = ? ORDER BY id", (int(user_id),)
+    ).fetchall()
+    return [r['bouquet_id'] for r in rows]
+
+def get_favorite_set(user_id):
+    return frozenset(get_favorites(user_id))
+
+def toggle_favorite(user_id, bouquet_id):
+    conn = _conn()
+    with conn:
+        deleted = conn.execute(
+            "DELETE FROM favorites WHERE user_id = ? AND bouquet_id = ?",
+            (int(user_id), bouquet_id)
+        ).rowcount
+        if not deleted:
+            conn.execute(
+                "INSERT INTO favorites (user_id, bouquet_id) VALUES (?, ?)",
+                (int(user_id), bouquet_id)
+            )
+
+def create_order(user_id, user_name, items):
+    order = {
+        'user_id': user_id,
+        'user_name': user_name,
+        'items': items,
+        'total_price': sum(item.get('total_price', 0) for item in items),
+        'status': 'pending'
+    }
+
+    counts = Counter(item['bouquet_id'] for item in items)
+    conn = _conn()
+    with conn:
+        # Блокировка записи берётся сразу, и номер со временем выдаются
+        # под ней - порядок seq совпадает с порядком номеров и created_at.
+        # Время не идёт назад, даже если отстали часы (как в YAML-хранилище)
+        conn.execute("BEGIN IMMEDIATE")
+        created_at = datetime.now().isoformat()
+        last = conn.execute("SELECT created_at FROM orders ORDER BY seq DESC LIMIT 1").fetchone()
+        if last and last[0] > created_at:
+            created_at = last[0]
+        order['order_id'] = ids.new_order_id()
+        order['created_at'] = created_at
+        _insert_order(conn, order)
+        _increment_bouquets_orders(conn, counts)
+    _bouquets_changed(list(counts))
+
+    return order['order_id']
+
+def _insert_order(conn, order):
+    conn.execute(
+        "INSERT INTO orders (order_id, user_id, user_name, created_at, total_price, status, items, legacy_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            order['order_id'], order['user_id'], order.get('user_name'), order['created_at'],
+            order.get('total_price', 0), order.get('status', 'pending'),
+            json.dumps(order.get('items', []), ensure_ascii=False), order.get('legacy_id')
+        )
+    )
+
+def get_user_orders(user_id, limit=None):
+    """Заказы пользователя по порядку создания; limit - только последние N"""
+    if limit is None:
+        rows = _conn().execute(
+            "SELECT * FROM orders WHERE user_id = ? ORDER BY seq", (user_id,)
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            "SELECT * FROM orders WHERE user_id = ? ORDER BY seq DESC LIMIT ?", (user_id, limit)
+        ).fetchall()[::-1]
+    return [_order_from_row(r) for r in rows]
+
+def get_order(order_id):
+    """Заказ по номеру (новому или старому) или None"""
+    conn = _conn()
+    row = conn.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+    if row is None:
+        row = conn.execute("SELECT * FROM orders WHERE legacy_id = ? ORDER BY seq LIMIT 1", (order_id,)).fetchone()
+    return _order_from_row(row) if row else None
+
+def get_orders_page(limit=10, before=None, after=None, status=None, user_id=None, date_from=None, date_to=None):
+    """Страница заказов, новые первыми (см. db.get_orders_page)"""
+    from . import db
+    conn = _conn()
+    conditions, params = [], []
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if date_from:
+        conditions.append("created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("created_at < ?")
+        params.append((date.fromisoformat(date_to) + timedelta(days=1)).isoformat())
+    
+    # Курсор - номер заказа; по уникальному индексу он превращается в seq
+    cursor_id = after if after is not None else before
+    cursor = None
+    if cursor_id is not None:
+        cursor = conn.execute("SELECT seq FROM orders WHERE order_id = ?", (cursor_id,)).fetchone()
+    if cursor is None:
+        before = after = None
+    elif after is not None:
+        conditions.append("seq > ?")
+        params.append(cursor['seq'])
+    else:
+        conditions.append("seq < ?")
+        params.append(cursor['seq'])
+    
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    rows = conn.execute(
+        f"SELECT * FROM orders {where}ORDER BY seq {'ASC' if after is not None else 'DESC'} LIMIT ?",
+        (*params, limit + 1)
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after is not None:
+        rows.reverse()
+    return db._page_cursors([_order_from_row(r) for r in rows], has_more, before, after)
+
+def get_all_orders():
+    rows = _conn().execute("SELECT * FROM orders ORDER BY seq").fetchall()
+    return [_order_from_row(r) for r in rows]
+
+def is_admin(user_id):
+    row = _conn().execute("SELECT 1 FROM admins WHERE user_id = ?", (user_id,)).fetchone()
+    return row is not None
+
+def get_admin_ids():
+    return [r['user_id'] for r in _conn().execute("SELECT user_id FROM admins ORDER BY user_id")]
+
+# Уже известные пользователи: повторный /start не идёт в базу
+_known_users = set()
+_last_seen = {}
+
+def save_user(user_id, username, first_name, last_name=""):
+    touch_user(user_id)
+    if user_id in _known_users:
+        return
+
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, registered_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, username, first_name, last_name, datetime.now().isoformat())
+        )
+    _known_users.add(user_id)
+
+def touch_user(user_id):
+    """Отметить визит пользователя (только в памяти, в базу - в flush_users)"""
+    _last_seen[user_id] = datetime.now().isoformat()
+
+def flush_users():
+    """Записать накопленные визиты одной транзакцией"""
+    batch = []
+    while _last_seen:
+        user_id, seen_at = _last_seen.popitem()
+        batch.append((seen_at, user_id))
+    if batch:
+        conn = _conn()
+        with conn:
+            conn.executemany("UPDATE users SET last_seen = ? WHERE user_id = ?", batch)
+    return len(batch)
+
+def delete_user(user_id):
+    """Убрать пользователя из реестра (например, заблокировал бота)"""
+    _last_seen.pop(user_id, None)
+    _known_users.discard(user_id)
+    conn = _conn()
+    with conn:
+        deleted = conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount
+    return bool(deleted)
+
+def get_users():
+    """Все зарегистрированные пользователи по порядку регистрации"""
+    rows = _conn().execute("SELECT * FROM users ORDER BY registered_at").fetchall()
+    return [dict(r) for r in rows]
+
+def get_stats():
+    # Агрегаты ведут триггеры на orders и users - полного прохода по заказам нет
+    conn = _conn()
+    total_orders, total_revenue = conn.execute(
+        "SELECT COALESCE(SUM(orders), 0), COALESCE(SUM(revenue), 0) FROM order_stats_daily"
+    ).fetchone()
+    today = conn.execute(
+        "SELECT orders, revenue FROM order_stats_daily WHERE day = ?",
+        (datetime.now().date().isoformat(),)
+    ).fetchone()
+    users = conn.execute("SELECT value FROM counters WHERE name = 'users'").fetchone()
+
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'total_users': users['value'] if users else 0,
+        'total_bouquets': conn.execute("SELECT COUNT(*) FROM bouquets").fetchone()[0],
+        'today_orders': today['orders'] if today else 0,
+        'today_revenue': today['revenue'] if today else 0
+    }
+
+def warm_up():
+    """Открыть соединение и создать схему заранее, до первых запросов"""
+    _conn()
+
+def get_photo_file_id(bouquet_id, image_hash):
+    row = _conn().execute(
+        "SELECT file_id FROM photo_file_ids WHERE bouquet_id = ? AND hash = ?",
+        (bouquet_id, image_hash)
+    ).fetchone()
+    return row['file_id'] if row else None
+
+def set_photo_file_id(bouquet_id, image_hash, file_id):
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO photo_file_ids (bouquet_id, hash, file_id) VALUES (?, ?, ?)",
+            (bouquet_id, image_hash, file_id)
+        )
+
+def forget_photo_file_id(bouquet_id):
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM photo_file_ids WHERE bouquet_id = ?", (bouquet_id,))
+
+def migrate_from_yaml():
+    """Однократно перенести данные из data/*.yaml в SQLite"""
+    from . import db
+
+    conn = _conn()
+    with conn:
+        for table in ('bouquets', 'cart_items', 'favorites', 'orders', 'users', 'admins', 'photo_file_ids',
+                      'order_stats_daily', 'counters'):
+            conn.execute(f"DELETE FROM {table}")
+
+        for position, bouquet in enumerate(db.load_yaml('bouquets.yaml').get('bouquets', []), start=1):
+            conn.execute(
+                "INSERT INTO bouquets (id, position, data) VALUES (?, ?, ?)",
+                (bouquet['id'], position, json.dumps(bouquet, ensure_ascii=False))
+            )
+
+        carts = db.load_yaml('carts.yaml').get('carts', {})
+        for user_key, items in carts.items():
+            for item in items:
+                conn.execute(
+                    "INSERT INTO cart_items (user_id, data) VALUES (?, ?)",
+                    (int(user_key), json.dumps(item, ensure_ascii=False))
+                )
+
+        favorites = db.load_yaml('favorites.yaml').get('favorites', {})
+        for user_key, bouquet_ids in favorites.items():
+            for bouquet_id in bouquet_ids:
+                conn.execute(
+                    "INSERT OR IGNORE INTO favorites (user_id, bouquet_id) VALUES (?, ?)",
+                    (int(user_key), bouquet_id)
+                )
+
+        # Снимок orders.yaml вместе с хвостом журнала; старые номера
+        # переводятся на лету - в базе номер уникален
+        for position, order in enumerate(db._load_orders()['orders']):
+            if not ids.is_order_id(order['order_id']):
+                order = ids.rekeyed(order, position)
+            _insert_order(conn, order)
+
+        # Снимок users.yaml вместе с хвостом журнала
+        for user in db._load_users()['users'].values():
+            conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, registered_at, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    user['user_id'], user.get('username'), user.get('first_name'),
+                    user.get('last_name', ''), user.get('registered_at') or datetime.now().isoformat(),
+                    user.get('last_seen')
+                )
+            )
+
+        for admin_id in _admin_sources():
+            conn.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (admin_id,))
+
+        for bouquet_id, entry in db.load_yaml('file_ids.yaml').get('file_ids', {}).items():
+            conn.execute(
+                "INSERT OR REPLACE INTO photo_file_ids (bouquet_id, hash, file_id) VALUES (?, ?, ?)",
+                (bouquet_id, entry['hash'], entry['file_id'])
+            )
+
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('bouquets', 'cart_items', 'favorites', 'orders', 'users', 'admins', 'photo_file_ids')
+    }
+
+if __name__ == '__main__':
+    counts = migrate_from_yaml()
+    print(f"✅ Данные перенесены в {DB_PATH}:")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
@@ -1,13 +1,18 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
 from database import db
+from services.media import reply_bouquet_photo
+from services import profiler, images, broadcast, render, pricing
 from config import ADMIN_IDS
+from datetime import date, datetime, timedelta
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 ADMIN_NAME, ADMIN_PRICE, ADMIN_PHOTO, ADMIN_POPULAR, CHANGE_NAME = range(5)
-CHANGE_PRICE_21, CHANGE_PRICE_51, CHANGE_PRICE_71, CHANGE_PRICE_101 = range(5, 9)
+CHANGE_PRICE = 5
+BROADCAST_CONTENT, BROADCAST_CONFIRM = range(9, 11)
 
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
@@ -27,11 +32,229 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+PROFILE_DEFAULT_UPDATES = 100
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [N | Ts | stop] - профиль следующих N апдейтов или T секунд"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
+        return
+    
+    arg = context.args[0].lower() if context.args else str(PROFILE_DEFAULT_UPDATES)
+    
+    if arg == 'stop':
+        if not await profiler.finish_capture():
+            await update.message.reply_text("Профилирование не запущено")
+        return
+    
+    if profiler.is_running():
+        await update.message.reply_text("Профилирование уже идёт. Остановить: /profile stop")
+        return
+    
+    try:
+        if arg.endswith('s'):
+            seconds, updates = int(arg[:-1]), None
+        else:
+            seconds, updates = None, int(arg)
+        if (seconds or updates or 0) <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "Использование:\n"
+            "/profile 100 - следующие 100 апдейтов\n"
+            "/profile 30s - следующие 30 секунд\n"
+            "/profile stop - остановить и получить отчёт"
+        )
+        return
+    
+    profiler.start_capture(context.application, update.effective_chat.id, updates=updates, seconds=seconds)
+    target = f"{updates} апдейтов" if updates else f"{seconds} с"
+    await update.message.reply_text(f"🔬 Профилирование запущено ({target}). Отчёт придёт файлом.")
+
+async def optimize_images_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/optimize_images [force] - подготовить облегчённые варианты всех фото"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
+        return
+    
+    if not images.available():
+        await update.message.reply_text("❌ Pillow не установлен - обработка фото недоступна")
+        return
+    
+    force = bool(context.args) and context.args[0].lower() == 'force'
+    bouquets = await db.aget_bouquets()
+    paths = [b['image_path'] for b in bouquets if b.get('image_path')]
+    
+    await update.message.reply_text(f"🖼 Обработка {len(paths)} фото...")
+    result = await images.aoptimize_all(paths, force=force)
+    
+    text = (
+        f"✅ Готово\n\n"
+        f"Обработано: {result['processed']}\n"
+        f"Уже были готовы: {result['skipped']}\n"
+        f"Ошибок: {result['failed']}"
+    )
+    if result['processed']:
+        text += f"\n\nРазмер: {result['bytes_before'] // 1024} КБ → {result['bytes_after'] // 1024} КБ"
+    await update.message.reply_text(text)
+
+async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast - рассылка всем пользователям бота"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
+        return ConversationHandler.END
+    
+    if broadcast.is_running():
+        await update.message.reply_text("📣 Рассылка уже идёт - прогресс в сообщении выше")
+        return ConversationHandler.END
+    
+    # Прерванная рассылка, которая не продолжилась сама (например, упала
+    # с ошибкой): продолжить её или начать новую
+    state = await asyncio.to_thread(broadcast.load_checkpoint)
+    if state:
+        keyboard = [
+            [InlineKeyboardButton("▶️ Продолжить", callback_data="bcast_resume")],
+            [InlineKeyboardButton("🗑 Сбросить и начать новую", callback_data="bcast_discard")]
+        ]
+        await update.message.reply_text(
+            f"*📣 Прошлая рассылка не завершена*\n\n"
+            f"Отправлено: {state['sent']} из {state['total']}\n\n/cancel - отмена",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+        return BROADCAST_CONTENT
+    
+    text, keyboard = broadcast_prompt()
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+    return BROADCAST_CONTENT
+
+def broadcast_prompt():
+    keyboard = [[InlineKeyboardButton("🌹 Промо букета", callback_data="bcast_promo")]]
+    text = (
+        "*📣 Рассылка*\n\n"
+        "Отправьте сообщение для рассылки (текст, фото с подписью и т.п.) "
+        "или выберите промо букета.\n\n/cancel - отмена"
+    )
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def broadcast_leftover(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Продолжить или сбросить прерванную рассылку"""
+    query = update.callback_query
+    await query.answer()
+    
+    if query.data == "bcast_resume":
+        if broadcast.resume(context.application):
+            await query.message.edit_text("▶️ Рассылка продолжается - прогресс в сообщении выше")
+        else:
+            await query.message.edit_text("📣 Рассылка уже идёт или завершена")
+        return ConversationHandler.END
+    
+    if not await asyncio.to_thread(broadcast.discard):
+        await query.message.edit_text("📣 Рассылка уже идёт - прогресс в сообщении выше")
+        return ConversationHandler.END
+    text, keyboard = broadcast_prompt()
+    await query.message.edit_text(text, reply_markup=keyboard, parse_mode='Markdown')
+    return BROADCAST_CONTENT
+
+async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сообщение админа, которое будет скопировано всем"""
+    context.user_data['broadcast'] = {
+        'kind': 'copy',
+        'from_chat_id': update.effective_chat.id,
+        'message_id': update.message.message_id
+    }
+    return await ask_broadcast_confirm(update.message, context)
+
+async def broadcast_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор букета для промо"""
+    query = update.callback_query
+    await query.answer()
+    
+    bouquets = await db.aget_bouquets()
+    if not bouquets:
+        await query.message.edit_text("Букетов пока нет")
+        return ConversationHandler.END
+    
+    keyboard = [
+        [InlineKeyboardButton(b['name'], callback_data=f"bcast_bouquet:{b['id']}")]
+        for b in bouquets
+    ]
+    await query.message.edit_text("Какой букет показать?", reply_markup=InlineKeyboardMarkup(keyboard))
+    return BROADCAST_CONTENT
+
+async def broadcast_bouquet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    bouquet = await db.aget_bouquet_by_id(query.data.split(":")[1])
+    if not bouquet:
+        await query.message.edit_text("❌ Букет не найден")
+        return ConversationHandler.END
+    
+    # Предпросмотр заодно загружает фото - рассылка пойдёт по file_id
+    await reply_bouquet_photo(
+        query.message,
+        bouquet,
+        caption=broadcast.promo_caption(bouquet),
+        reply_markup=broadcast.promo_keyboard(bouquet),
+        parse_mode='Markdown'
+    )
+    context.user_data['broadcast'] = {'kind': 'bouquet', 'bouquet_id': bouquet['id']}
+    return await ask_broadcast_confirm(query.message, context)
+
+async def ask_broadcast_confirm(message, context):
+    stats = await db.aget_stats()
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Отправить", callback_data="bcast_confirm"),
+            InlineKeyboardButton("❌ Отмена", callback_data="bcast_cancel")
+        ]
+    ]
+    await message.reply_text(
+        f"Отправить это {stats['total_users']} пользователям?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return BROADCAST_CONFIRM
+
+async def broadcast_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    content = context.user_data.pop('broadcast', None)
+    if query.data == "bcast_cancel" or not content:
+        await query.message.edit_text("❌ Рассылка отменена")
+        return ConversationHandler.END
+    
+    try:
+        await broadcast.start(context.application, content, update.effective_chat.id)
+    except RuntimeError as e:
+        await query.message.edit_text(f"❌ {e}")
+        return ConversationHandler.END
+    
+    await query.message.edit_text("📣 Рассылка запущена - прогресс в сообщении ниже")
+    return ConversationHandler.END
+
+async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop('broadcast', None)
+    await update.message.reply_text("❌ Отменено")
+    return ConversationHandler.END
+
+async def stop_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("❌ Доступ запрещен")
+        return
+    
+    if broadcast.stop():
+        await query.answer("Рассылка остановится после текущей пачки")
+    else:
+        await query.answer("Рассылка уже завершена")
+
 async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    stats = db.get_stats()
+    stats = await db.aget_stats()
     
     text = (
         f"*📊 Статистика*\n\n"
@@ -52,72 +275,221 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+ORDERS_PAGE_SIZE = 10
+# Фильтры браузера заказов переключаются по кругу кнопками
+ORDER_STATUSES = [None, 'pending', 'completed', 'cancelled']
+ORDER_STATUS_NAMES = {None: "все", 'pending': "⏳ новые", 'completed': "✅ выполнены", 'cancelled': "❌ отменены"}
+# Период: дней назад (0 - только сегодня), None - всё время
+ORDER_PERIODS = [None, 0, 7, 30]
+ORDER_PERIOD_NAMES = {None: "всё время", 0: "сегодня", 7: "7 дней", 30: "30 дней"}
+
+def _orders_filter(context):
+    """Фильтры браузера заказов админа (в user_data - переживают рестарт)"""
+    return context.user_data.setdefault('orders_filter', {
+        'status': None, 'period': None, 'date_from': None, 'date_to': None, 'user_id': None
+    })
+
+def _set_period(flt, period):
+    flt['period'] = period
+    flt['date_to'] = None
+    flt['date_from'] = None if period is None else (datetime.now().date() - timedelta(days=period)).isoformat()
+
+def _period_name(flt):
+    if flt['period'] is not None or not (flt['date_from'] or flt['date_to']):
+        return ORDER_PERIOD_NAMES[flt['period']]
+    # Период из /orders from=... to=...
+    return f"{flt['date_from'] or '…'} - {flt['date_to'] or '…'}"
+
+def orders_browser(page, flt):
+    """Текст и клавиатура страницы браузера заказов"""
+    text = f"*📦 Заказы*\n📌 {ORDER_STATUS_NAMES.get(flt['status'], flt['status'])} · 📅 {_period_name(flt)}"
+    if flt['user_id'] is not None:
+        text += f" · 👤 {flt['user_id']}"
+    text += "\n\n"
+    
+    if not page['orders']:
+        text += "Заказов не найдено"
+    for order in page['orders']:
+        text += (
+            f"🔹 #{order['order_id']}\n"
+            f"👤 {order['user_name']}\n"
+            f"💰 {order['total_price']}₽\n"
+            f"📅 {order['created_at'][:16]}\n\n"
+        )
+    
+    keyboard = []
+    nav = []
+    if page['newer']:
+        nav.append(InlineKeyboardButton("◀️ Новее", callback_data=f"aord:newer:{page['newer']}"))
+    if page['older']:
+        nav.append(InlineKeyboardButton("Старее ▶️", callback_data=f"aord:older:{page['older']}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([
+        InlineKeyboardButton(f"📌 {ORDER_STATUS_NAMES.get(flt['status'], flt['status'])}", callback_data="aord_status"),
+        InlineKeyboardButton(f"📅 {_period_name(flt)}", callback_data="aord_period")
+    ])
+    if any(flt[key] is not None for key in ('status', 'date_from', 'date_to', 'user_id')):
+        keyboard.append([InlineKeyboardButton("✖️ Сбросить фильтры", callback_data="aord_reset")])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="admin_back")])
+    
+    return text.rstrip(), InlineKeyboardMarkup(keyboard)
+
+async def _orders_page(flt, before=None, after=None):
+    return await db.aget_orders_page(
+        limit=ORDERS_PAGE_SIZE, before=before, after=after,
+        status=flt['status'], user_id=flt['user_id'],
+        date_from=flt['date_from'], date_to=flt['date_to']
+    )
+
 async def show_admin_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Браузер заказов: с кнопок фильтров и страниц, из панели - без фильтров"""
     query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("❌ Доступ запрещен")
+        return
     await query.answer()
     
-    orders = db.get_all_orders()
-    
-    if not orders:
-        await query.message.edit_text("Заказов пока нет")
+    before = after = None
+    if query.data == 'admin_orders' or query.data == 'aord_reset':
+        context.user_data.pop('orders_filter', None)
+    elif query.data == 'aord_status':
+        flt = _orders_filter(context)
+        flt['status'] = ORDER_STATUSES[(ORDER_STATUSES.index(flt['status']) + 1) % len(ORDER_STATUSES)] \
+            if flt['status'] in ORDER_STATUSES else None
+    elif query.data == 'aord_period':
+        flt = _orders_filter(context)
+        period = flt['period'] if flt['period'] in ORDER_PERIODS else None
+        _set_period(flt, ORDER_PERIODS[(ORDER_PERIODS.index(period) + 1) % len(ORDER_PERIODS)])
+    else:
+        # aord:older:<номер> или aord:newer:<номер>
+        _, direction, cursor = query.data.split(":")
+        if direction == 'older':
+            before = cursor
+        else:
+            after = cursor
+    
+    flt = _orders_filter(context)
+    page = await _orders_page(flt, before, after)
+    text, keyboard = orders_browser(page, flt)
+    
+    await query.message.edit_text(text, reply_markup=keyboard, parse_mode='Markdown')
+
+async def orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/orders [status=pending] [from=2024-05-01] [to=2024-05-31] [user=123] - браузер заказов с фильтрами"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
         return
     
-    text = "*📦 Последние 10 заказов:*\n\n"
+    flt = {'status': None, 'period': None, 'date_from': None, 'date_to': None, 'user_id': None}
+    try:
+        for arg in context.args:
+            key, value = arg.split("=", 1)
+            if key == 'status' and value in ORDER_STATUSES:
+                flt['status'] = value
+            elif key in ('from', 'to'):
+                # Проверка формата: YYYY-MM-DD
+                flt['date_' + key] = date.fromisoformat(value).isoformat()
+            elif key == 'user':
+                flt['user_id'] = int(value)
+            else:
+                raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "Использование:\n"
+            "/orders - все заказы\n"
+            "/orders status=pending|completed|cancelled\n"
+            "/orders from=2024-05-01 to=2024-05-31\n"
+            "/orders user=123456789\n"
+            "Параметры можно сочетать."
+        )
+        return
     
-    for order in orders[-10:]:
+    context.user_data['orders_filter'] = flt
+    page = await _orders_page(flt)
+    text, keyboard = orders_browser(page, flt)
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
+
+def order_details(order):
+    text = (
+        f"📦 *Заказ #{order['order_id']}*\n"
+        f"👤 {order['user_name']} (id {order['user_id']})\n"
+        f"📅 {order['created_at'][:16]}\n"
+        f"📌 Статус: {order.get('status', 'pending')}\n"
+    )
+    if order.get('legacy_id'):
+        text += f"🔁 Прежний номер: `{order['legacy_id']}`\n"
+    text += "\n"
+    for item in order.get('items', []):
         text += (
-            f"🔹 #{order['order_id']}\n"
-            f"👤 {order['user_name']}\n"
-            f"💰 {order['total_price']}₽\n"
-            f"📅 {order['created_at'][:16]}\n\n"
+            f"🌹 {item.get('bouquet_name', item.get('bouquet_id'))}, {item.get('quantity', '?')} роз\n"
+            f"   {item.get('date', '')} {item.get('time', '')}, {item.get('address', 'Самовывоз')} - "
+            f"{item.get('total_price', 0)}₽\n"
         )
+    text += f"\n💰 Итого: {order['total_price']}₽"
+    return text
+
+async def order_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/order <номер> - заказ по номеру (подходит и старый order_...)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
+        return
     
-    keyboard = [[InlineKeyboardButton("◀️ Назад", callback_data="admin_back")]]
+    if not context.args:
+        await update.message.reply_text("Использование: /order <номер заказа>")
+        return
     
-    await query.message.edit_text(
-        text,
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
+    order_id = context.args[0].lstrip('#')
+    order = await db.aget_order(order_id) or await db.aget_order(order_id.upper())
+    if order is None:
+        await update.message.reply_text("❌ Заказ не найден")
+        return
+    
+    await update.message.reply_text(order_details(order), parse_mode='Markdown')
+
+def admin_bouquet_card(bouquet):
+    order_count = bouquet.get('order_count', 0)
+    text = (
+        f"{'🔥 ' if bouquet.get('is_popular') else ''}*{bouquet['name']}*\n\n"
+        f"💰 {bouquet['base_price']}₽\n"
+        f"📦 Заказов: {order_count}"
     )
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("✏️ Поменять название", callback_data=f"change_name:{bouquet['id']}"),
+            InlineKeyboardButton("💰 Поменять цену", callback_data=f"change_price:{bouquet['id']}")
+        ],
+        [InlineKeyboardButton("🗑 Удалить", callback_data=f"delete:{bouquet['id']}")],
+        [InlineKeyboardButton(
+            "🔥 Снять популярность" if bouquet.get('is_popular') else "⭐️ Сделать популярным",
+            callback_data=f"toggle_pop:{bouquet['id']}"
+        )]
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
 
 async def show_admin_bouquets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    bouquets = db.get_bouquets()
+    since = render.token()
+    bouquets = await db.aget_bouquets()
     
     if not bouquets:
         await query.message.edit_text("Букетов пока нет")
         return
     
     for bouquet in bouquets:
-        order_count = bouquet.get('order_count', 0)
-        text = (
-            f"{'🔥 ' if bouquet.get('is_popular') else ''}*{bouquet['name']}*\n\n"
-            f"💰 {bouquet['base_price']}₽\n"
-            f"📦 Заказов: {order_count}"
-        )
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("✏️ Поменять название", callback_data=f"change_name:{bouquet['id']}"),
-                InlineKeyboardButton("💰 Поменять цену", callback_data=f"change_price:{bouquet['id']}")
-            ],
-            [InlineKeyboardButton("🗑 Удалить", callback_data=f"delete:{bouquet['id']}")],
-            [InlineKeyboardButton(
-                "🔥 Снять популярность" if bouquet.get('is_popular') else "⭐️ Сделать популярным",
-                callback_data=f"toggle_pop:{bouquet['id']}"
-            )]
-        ]
+        text, keyboard = render.cached(bouquet['id'], 'admin', lambda: admin_bouquet_card(bouquet), since)
         
         try:
-            with open(bouquet['image_path'], 'rb') as photo:
-                await query.message.reply_photo(
-                    photo=photo,
-                    caption=text,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown'
-                )
+            await reply_bouquet_photo(
+                query.message,
+                bouquet,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode='Markdown'
+            )
         except Exception as e:
             logger.error(f"Photo error: {e}")
     
@@ -132,151 +504,75 @@ async def toggle_popular(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     bouquet_id = query.data.split(":")[1]
-    bouquet = db.get_bouquet_by_id(bouquet_id)
+    bouquet = await db.aget_bouquet_by_id(bouquet_id)
     
     if bouquet:
         new_status = not bouquet.get('is_popular', False)
-        db.update_bouquet(bouquet_id, {'is_popular': new_status})
+        await db.aupdate_bouquet(bouquet_id, {'is_popular': new_status})
         
         await query.answer("✅ Обновлено")
         await query.message.delete()
 
+def _roses(count):
+    """21 розу, 22 розы, 25 роз"""
+    if count % 10 == 1 and count % 100 != 11:
+        return f"{count} розу"
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return f"{count} розы"
+    return f"{count} роз"
+
 async def start_change_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Начать изменение цены - шаг 1: 21 роза"""
+    """Начать изменение цены - по очереди для каждого количества роз букета"""
     query = update.callback_query
     await query.answer()
     
     bouquet_id = query.data.split(":")[1]
-    bouquet = db.get_bouquet_by_id(bouquet_id)
+    bouquet = await db.aget_bouquet_by_id(bouquet_id)
     
     if not bouquet:
         await query.message.reply_text("❌ Букет не найден")
         return ConversationHandler.END
     
-    context.user_data['change_price_bouquet_id'] = bouquet_id
-    context.user_data['new_prices'] = {}
-    
-    # Фиксированные текущие цены
-    context.user_data['current_prices'] = {
-        21: 1100,
-        51: 2300,
-        71: 3200,
-        101: 4500
-    }
-    
-    keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_21")]]
-    
-    await query.message.reply_text(
-        f"*{bouquet['name']}*\n\n"
-        f"Сейчас цена за 21 розу - 1100₽\n"
-        f"На какую сумму хотите поменять?",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
-    
-    return CHANGE_PRICE_21
-
-async def change_price_21(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Получить цену за 21 розу"""
-    if update.callback_query:
-        # Пропустить
-        await update.callback_query.answer()
-        return await ask_price_51(update.callback_query.message, context)
-    
-    try:
-        new_price = int(update.message.text)
-        if new_price <= 0:
-            await update.message.reply_text("❌ Цена должна быть больше 0!")
-            return CHANGE_PRICE_21
-        
-        context.user_data['new_prices'][21] = new_price
-        return await ask_price_51(update.message, context)
-        
-    except ValueError:
-        await update.message.reply_text("❌ Введите число!")
-        return CHANGE_PRICE_21
-
-async def ask_price_51(message, context):
-    """Спросить цену за 51 розу"""
-    current_price = context.user_data['current_prices'][51]
-    keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_51")]]
-    
-    await message.reply_text(
-        f"Сейчас цена за 51 розу - {current_price}₽\n"
-        f"На какую сумму хотите поменять?",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
-    
-    return CHANGE_PRICE_51
-
-async def change_price_51(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Получить цену за 51 розу"""
-    if update.callback_query:
-        # Пропустить
-        await update.callback_query.answer()
-        return await ask_price_71(update.callback_query.message, context)
-    
-    try:
-        new_price = int(update.message.text)
-        if new_price <= 0:
-            await update.message.reply_text("❌ Цена должна быть больше 0!")
-            return CHANGE_PRICE_51
-        
-        context.user_data['new_prices'][51] = new_price
-        return await ask_price_71(update.message, context)
-        
-    except ValueError:
-        await update.message.reply_text("❌ Введите число!")
-        return CHANGE_PRICE_51
-
-async def ask_price_71(message, context):
-    """Спросить цену за 71 розу"""
-    current_price = context.user_data['current_prices'][71]
-    keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_71")]]
-    
-    await message.reply_text(
-        f"Сейчас цена за 71 розу - {current_price}₽\n"
-        f"На какую сумму хотите поменять?",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    if not bouquet.get('quantities'):
+        await query.message.reply_text("❌ У букета не заданы количества роз")
+        return ConversationHandler.END
     
-    return CHANGE_PRICE_71
-
-async def change_price_71(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Получить цену за 71 розу"""
-    if update.callback_query:
-        # Пропустить
-        await update.callback_query.answer()
-        return await ask_price_101(update.callback_query.message, context)
+    table = pricing.price_table(bouquet_id)
+    if table is None:
+        # Букет удалили, пока открывалась кнопка
+        await query.message.reply_text("❌ Букет не найден")
+        return ConversationHandler.END
     
-    try:
-        new_price = int(update.message.text)
-        if new_price <= 0:
-            await update.message.reply_text("❌ Цена должна быть больше 0!")
-            return CHANGE_PRICE_71
-        
-        context.user_data['new_prices'][71] = new_price
-        return await ask_price_101(update.message, context)
-        
-    except ValueError:
-        await update.message.reply_text("❌ Введите число!")
-        return CHANGE_PRICE_71
+    context.user_data['change_price_bouquet_id'] = bouquet_id
+    # Цены - списками по порядку price_steps (user_data сохраняется в JSON,
+    # где ключи словаря стали бы строками); None - цену не меняли
+    steps = [qty['value'] for qty in bouquet['quantities']]
+    table = table['quantities']
+    context.user_data['price_steps'] = steps
+    context.user_data['current_prices'] = [table[value] for value in steps]
+    context.user_data['new_prices'] = [None] * len(steps)
+    context.user_data['price_step'] = 0
+    
+    await query.message.reply_text(f"*{bouquet['name']}*", parse_mode='Markdown')
+    return await ask_price(query.message, context)
 
-async def ask_price_101(message, context):
-    """Спросить цену за 101 розу"""
-    current_price = context.user_data['current_prices'][101]
-    keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_101")]]
+async def ask_price(message, context):
+    """Спросить цену для очередного количества роз"""
+    step = context.user_data['price_step']
+    value = context.user_data['price_steps'][step]
+    current_price = context.user_data['current_prices'][step]
+    keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_price")]]
     
     await message.reply_text(
-        f"Сейчас цена за 101 розу - {current_price}₽\n"
+        f"Сейчас цена за {_roses(value)} - {current_price}₽\n"
         f"На какую сумму хотите поменять?",
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
     
-    return CHANGE_PRICE_101
+    return CHANGE_PRICE
 
-async def change_price_101(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Получить цену за 101 розу и сохранить все изменения"""
+async def change_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получить цену (или пропуск) и перейти к следующему количеству"""
     if update.callback_query:
         # Пропустить
         await update.callback_query.answer()
@@ -284,59 +580,71 @@ async def change_price_101(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         try:
             new_price = int(update.message.text)
-            if new_price <= 0:
-                await update.message.reply_text("❌ Цена должна быть больше 0!")
-                return CHANGE_PRICE_101
-            
-            context.user_data['new_prices'][101] = new_price
-            message = update.message
-            
         except ValueError:
             await update.message.reply_text("❌ Введите число!")
-            return CHANGE_PRICE_101
+            return CHANGE_PRICE
+        
+        if new_price <= 0:
+            await update.message.reply_text("❌ Цена должна быть больше 0!")
+            return CHANGE_PRICE
+        
+        context.user_data['new_prices'][context.user_data['price_step']] = new_price
+        message = update.message
     
-    # Сохраняем изменения
+    context.user_data['price_step'] += 1
+    if context.user_data['price_step'] < len(context.user_data['price_steps']):
+        return await ask_price(message, context)
+    return await save_prices(message, context)
+
+async def save_prices(message, context):
+    """Сохранить все изменения цен"""
     bouquet_id = context.user_data['change_price_bouquet_id']
-    bouquet = db.get_bouquet_by_id(bouquet_id)
+    bouquet = await db.aget_bouquet_by_id(bouquet_id)
     new_prices = context.user_data['new_prices']
     current_prices = context.user_data['current_prices']
     
     # Если НИ ОДНОЙ цены не изменили - отменяем
-    if not new_prices:
+    if all(price is None for price in new_prices):
         await message.reply_text("❌ Цены не изменены")
         context.user_data.clear()
         return ConversationHandler.END
     
-    # Берём за базу цену 101 розы (если не изменили - оставляем старую)
-    base_price = new_prices.get(101, current_prices[101])
+    if not bouquet:
+        await message.reply_text("❌ Букет не найден")
+        context.user_data.clear()
+        return ConversationHandler.END
+    
+    steps = context.user_data['price_steps']
+    if [q['value'] for q in bouquet['quantities']] != steps:
+        # Количества роз поменяли, пока шёл диалог (другой админ, /reprice) -
+        # введённые цены к ним уже не относятся, а запись затёрла бы их правку
+        await message.reply_text("❌ Количества роз букета изменились, пока вводились цены. Начните заново")
+        context.user_data.clear()
+        return ConversationHandler.END
     
-    # Пересчитываем множители
     final_prices = {
-        21: new_prices.get(21, current_prices[21]),
-        51: new_prices.get(51, current_prices[51]),
-        71: new_prices.get(71, current_prices[71]),
-        101: base_price
+        value: current if new is None else new
+        for value, current, new in zip(steps, current_prices, new_prices)
     }
     
-    # Обновляем quantities с новыми множителями
+    # База - цена количества с множителем 1.0 (обычно самого большого)
+    base_value = next((q['value'] for q in bouquet['quantities'] if q['multiplier'] == 1.0), max(steps))
+    base_price = final_prices[base_value]
+    
+    # Множители с запасом точности: round(база * множитель) даёт ровно введённую цену
     new_quantities = [
-        {"value": 21, "multiplier": round(final_prices[21] / base_price, 3)},
-        {"value": 51, "multiplier": round(final_prices[51] / base_price, 3)},
-        {"value": 71, "multiplier": round(final_prices[71] / base_price, 3)},
-        {"value": 101, "multiplier": 1.0}
+        {"value": value, "multiplier": round(final_prices[value] / base_price, 9)}
+        for value in steps
     ]
     
-    db.update_bouquet(bouquet_id, {
+    await db.aupdate_bouquet(bouquet_id, {
         'base_price': base_price,
         'quantities': new_quantities
     })
     
     # Формируем итоговое сообщение
     result_text = f"✅ *Цены обновлены!*\n\n🌹 {bouquet['name']}\n\n"
-    result_text += f"21 роза: {final_prices[21]}₽\n"
-    result_text += f"51 роза: {final_prices[51]}₽\n"
-    result_text += f"71 роза: {final_prices[71]}₽\n"
-    result_text += f"101 роза: {final_prices[101]}₽"
+    result_text += "\n".join(f"{_roses(value).replace('розу', 'роза')}: {final_prices[value]}₽" for value in steps)
     
     await message.reply_text(result_text, parse_mode='Markdown')
     
@@ -348,8 +656,35 @@ async def cancel_change_price(update: Update, context: ContextTypes.DEFAULT_TYPE
     context.user_data.clear()
     await update.message.reply_text("❌ Отменено")
     return ConversationHandler.END
-    await update.message.reply_text("❌ Отменено")
-    return ConversationHandler.END
+
+async def reprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/reprice +10 | -5 - изменить цены всего каталога на N процентов"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ Доступ запрещен")
+        return
+    
+    try:
+        percent = float(context.args[0].rstrip('%'))
+        if percent <= -100:
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text(
+            "Использование:\n"
+            "/reprice +10 - поднять все цены на 10%\n"
+            "/reprice -5 - снизить все цены на 5%"
+        )
+        return
+    
+    bouquets = await db.aget_bouquets()
+    updates = pricing.scale_catalog(bouquets, percent)
+    lines = [
+        f"{b['name']}: {b['base_price']}₽ → {updates[b['id']]['base_price']}₽"
+        for b in bouquets
+    ]
+    # Весь каталог - одной записью
+    await db.aupdate_bouquets(updates)
+    
+    await update.message.reply_text(f"✅ Цены изменены на {percent:+g}%\n\n" + "\n".join(lines))
 
 async def start_change_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начать изменение названия"""
@@ -357,7 +692,7 @@ async def start_change_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     bouquet_id = query.data.split(":")[1]
-    bouquet = db.get_bouquet_by_id(bouquet_id)
+    bouquet = await db.aget_bouquet_by_id(bouquet_id)
     
     if not bouquet:
         await query.message.reply_text("❌ Букет не найден")
@@ -388,7 +723,7 @@ async def name_changed(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return CHANGE_NAME
     
     # Обновляем название
-    db.update_bouquet(bouquet_id, {'name': new_name})
+    await db.aupdate_bouquet(bouquet_id, {'name': new_name})
     
     await update.message.reply_text(
         f"✅ *Название обновлено!*\n\n"
@@ -428,7 +763,8 @@ async def delete_bouquet_confirmed(update: Update, context: ContextTypes.DEFAULT
     await query.answer("Удалено")
     
     bouquet_id = query.data.split(":")[1]
-    db.delete_bouquet(bouquet_id)
+    await db.adelete_bouquet(bouquet_id)
+    await db.aforget_photo_file_id(bouquet_id)
     await query.message.delete()
 
 async def start_add_bouquet(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -468,7 +804,7 @@ async def admin_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     photo = update.message.photo[-1]
     file = await context.bot.get_file(photo.file_id)
     
-    all_bouquets = db.get_bouquets()
+    all_bouquets = await db.aget_bouquets()
     max_id = 0
     for b in all_bouquets:
         try:
@@ -482,6 +818,10 @@ async def admin_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     filename = f"images/b{new_id}.jpg"
     
     await file.download_to_drive(filename)
+    # Картинка по этому пути могла принадлежать удалённому букету с тем же id
+    await db.aforget_photo_file_id(f"b{new_id}")
+    # Облегчённые варианты готовятся в фоне; до их готовности уходит оригинал
+    images.schedule_optimize(filename)
     context.user_data['new_bouquet']['image_path'] = filename
     
     keyboard = [
@@ -517,7 +857,7 @@ async def admin_popular(update: Update, context: ContextTypes.DEFAULT_TYPE):
         {"type": "black", "name": "Черная", "price": 500}
     ]
     
-    bouquet_id = db.save_bouquet(bouquet_data)
+    bouquet_id = await db.asave_bouquet(bouquet_data)
     
     await query.message.edit_text(
         f"✅ *Букет добавлен!*\n\n"
@@ -554,14 +894,20 @@ async def admin_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def register_handlers(application):
     application.add_handler(CommandHandler("admin", admin_panel))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("optimize_images", optimize_images_command))
+    application.add_handler(CommandHandler("reprice", reprice_command))
+    application.add_handler(CommandHandler("order", order_command))
+    application.add_handler(CommandHandler("orders", orders_command))
     
     application.add_handler(CallbackQueryHandler(show_stats, pattern="^admin_stats$"))
-    application.add_handler(CallbackQueryHandler(show_admin_orders, pattern="^admin_orders$"))
+    application.add_handler(CallbackQueryHandler(show_admin_orders, pattern="^(admin_orders|aord_status|aord_period|aord_reset|aord:)"))
     application.add_handler(CallbackQueryHandler(show_admin_bouquets, pattern="^admin_bouquets$"))
     application.add_handler(CallbackQueryHandler(toggle_popular, pattern="^toggle_pop:"))
     application.add_handler(CallbackQueryHandler(delete_bouquet_confirm, pattern="^delete:"))
     application.add_handler(CallbackQueryHandler(delete_bouquet_confirmed, pattern="^confirm_delete:"))
     application.add_handler(CallbackQueryHandler(admin_back, pattern="^admin_back$"))
+    application.add_handler(CallbackQueryHandler(stop_broadcast, pattern="^broadcast_stop$"))
     
     # ConversationHandler для добавления букета
     add_bouquet_conv = ConversationHandler(
@@ -572,31 +918,23 @@ def register_handlers(application):
             ADMIN_PHOTO: [MessageHandler(filters.PHOTO, admin_photo)],
             ADMIN_POPULAR: [CallbackQueryHandler(admin_popular, pattern="^popular:")]
         },
-        fallbacks=[CommandHandler("cancel", cancel_add)]
+        fallbacks=[CommandHandler("cancel", cancel_add)],
+        name="add_bouquet",
+        persistent=True
     )
     
     # ConversationHandler для изменения цены
     change_price_conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(start_change_price, pattern="^change_price:")],
         states={
-            CHANGE_PRICE_21: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, change_price_21),
-                CallbackQueryHandler(change_price_21, pattern="^skip_21$")
-            ],
-            CHANGE_PRICE_51: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, change_price_51),
-                CallbackQueryHandler(change_price_51, pattern="^skip_51$")
-            ],
-            CHANGE_PRICE_71: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, change_price_71),
-                CallbackQueryHandler(change_price_71, pattern="^skip_71$")
-            ],
-            CHANGE_PRICE_101: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, change_price_101),
-                CallbackQueryHandler(change_price_101, pattern="^skip_101$")
+            CHANGE_PRICE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, change_price),
+                CallbackQueryHandler(change_price, pattern="^skip_price$")
             ]
         },
-        fallbacks=[CommandHandler("cancel", cancel_change_price)]
+        fallbacks=[CommandHandler("cancel", cancel_change_price)],
+        name="change_price",
+        persistent=True
     )
     
     # ConversationHandler для изменения названия
@@ -605,9 +943,29 @@ def register_handlers(application):
         states={
             CHANGE_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, name_changed)]
         },
-        fallbacks=[CommandHandler("cancel", cancel_change_name)]
+        fallbacks=[CommandHandler("cancel", cancel_change_name)],
+        name="change_name",
+        persistent=True
+    )
+    
+    # ConversationHandler для рассылки
+    broadcast_conv = ConversationHandler(
+        entry_points=[CommandHandler("broadcast", start_broadcast)],
+        states={
+            BROADCAST_CONTENT: [
+                CallbackQueryHandler(broadcast_leftover, pattern="^bcast_(resume|discard)$"),
+                CallbackQueryHandler(broadcast_promo, pattern="^bcast_promo$"),
+                CallbackQueryHandler(broadcast_bouquet, pattern="^bcast_bouquet:"),
+                MessageHandler(~filters.COMMAND, broadcast_message)
+            ],
+            BROADCAST_CONFIRM: [CallbackQueryHandler(broadcast_confirmed, pattern="^bcast_(confirm|cancel)$")]
+        },
+        fallbacks=[CommandHandler("cancel", cancel_broadcast)],
+        name="broadcast",
+        persistent=True
     )
     
     application.add_handler(add_bouquet_conv)
     application.add_handler(change_price_conv)
-    application.add_handler(change_name_conv)
\ No newline at end of file
+    application.add_handler(change_name_conv)
+    application.add_handler(broadcast_conv)
\ No newline at end of file
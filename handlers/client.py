@@ -1,6 +1,8 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ConversationHandler
 from database import db
+from services.media import reply_bouquet_photo, edit_bouquet_photo
+from services import notifications, render, pricing
 from config import CONTACT_USERNAME, ADMIN_IDS
 import logging
 from datetime import datetime, timedelta
@@ -20,9 +22,14 @@ def get_main_menu():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
+async def track_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Только отметка в памяти - на диск визиты пишутся пачкой
+    if update.effective_user:
+        db.touch_user(update.effective_user.id)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db.save_user(user.id, user.username, user.first_name, user.last_name or "")
+    await db.asave_user(user.id, user.username, user.first_name, user.last_name or "")
     
     await update.message.reply_text(
         "🌹 *Добро пожаловать в Satin flowers!*\n\n"
@@ -32,8 +39,40 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+def catalog_caption(bouquet):
+    return (
+        f"{'🔥 ' if bouquet.get('is_popular') else ''}"
+        f"*{bouquet['name']}*"
+    )
+
+def catalog_keyboard(bouquet, index, total, is_fav):
+    keyboard = [
+        [
+            InlineKeyboardButton("🛒 Заказать", callback_data=f"order:{bouquet['id']}"),
+            InlineKeyboardButton("❤️" if is_fav else "♡", callback_data=f"fav:{bouquet['id']}")
+        ]
+    ]
+    
+    # Листание по кругу, если в каталоге больше одного букета
+    if total > 1:
+        keyboard.append([
+            InlineKeyboardButton("◀️", callback_data=f"cat:{(index - 1) % total}"),
+            InlineKeyboardButton(f"{index + 1}/{total}", callback_data="cat_noop"),
+            InlineKeyboardButton("▶️", callback_data=f"cat:{(index + 1) % total}")
+        ])
+    
+    return InlineKeyboardMarkup(keyboard)
+
+def catalog_card(bouquet, index, total, is_fav, since):
+    """Подпись и клавиатура карточки каталога (из кэша отрисовки)"""
+    caption = render.cached(bouquet['id'], 'catalog_caption', lambda: catalog_caption(bouquet), since)
+    keyboard = render.cached(bouquet['id'], ('catalog', index, total, is_fav),
+                             lambda: catalog_keyboard(bouquet, index, total, is_fav), since)
+    return caption, keyboard
+
 async def catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    bouquets = db.get_bouquets()
+    since = render.token()
+    bouquets = await db.aget_bouquets()
     
     if not bouquets:
         await update.message.reply_text(
@@ -41,39 +80,72 @@ async def catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    favorites = db.get_favorites(update.effective_user.id)
+    favorites = await db.aget_favorite_set(update.effective_user.id)
+    bouquet = bouquets[0]
+    caption, keyboard = catalog_card(bouquet, 0, len(bouquets), bouquet['id'] in favorites, since)
     
-    for bouquet in bouquets:
-        is_fav = bouquet['id'] in favorites
-        caption = (
-            f"{'🔥 ' if bouquet.get('is_popular') else ''}"
-            f"*{bouquet['name']}*"
+    # Одно сообщение-карусель вместо отдельного фото на каждый букет
+    try:
+        await reply_bouquet_photo(
+            update.message,
+            bouquet,
+            caption=caption,
+            reply_markup=keyboard,
+            parse_mode='Markdown'
         )
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("🛒 Заказать", callback_data=f"order:{bouquet['id']}"),
-                InlineKeyboardButton("❤️" if is_fav else "♡", callback_data=f"fav:{bouquet['id']}")
-            ]
-        ]
-        
-        try:
-            with open(bouquet['image_path'], 'rb') as photo:
-                await update.message.reply_photo(
-                    photo=photo,
-                    caption=caption,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown'
-                )
-        except Exception as e:
-            logger.error(f"Photo error: {e}")
+    except Exception as e:
+        logger.error(f"Photo error: {e}")
+
+async def catalog_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    since = render.token()
+    bouquets = await db.aget_bouquets()
+    if not bouquets:
+        await query.message.edit_caption(caption="Каталог пуст")
+        return
+    
+    index = int(query.data.split(":")[1]) % len(bouquets)
+    bouquet = bouquets[index]
+    favorites = await db.aget_favorite_set(update.effective_user.id)
+    caption, keyboard = catalog_card(bouquet, index, len(bouquets), bouquet['id'] in favorites, since)
+    
+    try:
+        await edit_bouquet_photo(
+            query,
+            bouquet,
+            caption=caption,
+            reply_markup=keyboard,
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.error(f"Photo error: {e}")
+
+async def catalog_noop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+
+def quantity_menu(bouquet):
+    """Текст и клавиатура выбора количества роз"""
+    prices = pricing.price_table(bouquet['id'])['quantities']
+    keyboard = []
+    for qty in bouquet.get('quantities', []):
+        val = qty['value']
+        keyboard.append([InlineKeyboardButton(
+            f"{val} роз - {prices[val]}₽",
+            callback_data=f"qty:{val}"
+        )])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
+    
+    return f"*{bouquet['name']}*\n\nВыберите количество роз:", InlineKeyboardMarkup(keyboard)
 
 async def start_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     bouquet_id = query.data.split(":")[1]
-    bouquet = db.get_bouquet_by_id(bouquet_id)
+    since = render.token()
+    bouquet = await db.aget_bouquet_by_id(bouquet_id)
     
     if not bouquet:
         await query.message.reply_text("Букет не найден")
@@ -82,51 +154,49 @@ async def start_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['bouquet'] = bouquet
     context.user_data['order'] = {}
     
-    keyboard = []
-    for qty in bouquet.get('quantities', []):
-        val = qty['value']
-        # Фиксированные цены
-        if val == 21:
-            price = 1100
-        elif val == 51:
-            price = 2300
-        elif val == 71:
-            price = 3200
-        elif val == 101:
-            price = 4500
-        else:
-            price = int(bouquet['base_price'] * qty['multiplier'])
-        
-        keyboard.append([InlineKeyboardButton(
-            f"{val} роз - {price}₽",
-            callback_data=f"qty:{val}:{price}"
-        )])
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
-    
-    await query.message.reply_text(
-        f"*{bouquet['name']}*\n\nВыберите количество роз:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='Markdown'
-    )
+    text, keyboard = render.cached(bouquet_id, 'quantities', lambda: quantity_menu(bouquet), since)
+    await query.message.reply_text(text, reply_markup=keyboard, parse_mode='Markdown')
     
     return CHOOSING_QUANTITY
 
+async def current_bouquet(context):
+    """Букет заказа по текущему каталогу. В user_data - копия с начала заказа
+    (могла пережить рестарт и правку каталога), она обновляется; None - букет удалён"""
+    bouquet = await db.aget_bouquet_by_id(context.user_data['bouquet']['id'])
+    if bouquet is not None:
+        context.user_data['bouquet'] = bouquet
+    return bouquet
+
+async def bouquet_gone(message, context):
+    context.user_data.clear()
+    await message.reply_text("❌ Этот букет больше недоступен или изменился, начните заказ заново из каталога")
+    return ConversationHandler.END
+
 async def choose_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    _, qty, price = query.data.split(":")
-    context.user_data['order']['quantity'] = int(qty)
-    context.user_data['order']['base_price'] = int(price)
+    bouquet = await current_bouquet(context)
+    if bouquet is None:
+        return await bouquet_gone(query.message, context)
     
-    bouquet = context.user_data['bouquet']
+    # Цена берётся из таблицы цен, в кнопке - только количество. Кнопка
+    # могла устареть (букет переоценили или удалили) или быть подделана
+    table = pricing.price_table(bouquet['id'])
+    value = query.data.split(":")[1]
+    quantity = int(value) if value.isdigit() else None
+    if table is None or quantity not in table['quantities']:
+        return await bouquet_gone(query.message, context)
+    context.user_data['order']['quantity'] = quantity
+    prices = table['packaging']
     
     keyboard = []
     for pkg in bouquet.get('packaging', []):
         label = pkg['name']
-        if pkg['price'] > 0:
-            label += f" (+{pkg['price']}₽)"
-        keyboard.append([InlineKeyboardButton(label, callback_data=f"pkg:{pkg['type']}:{pkg['price']}")])
+        price = prices.get(pkg['type'], 0)
+        if price > 0:
+            label += f" (+{price}₽)"
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"pkg:{pkg['type']}")])
     
     await query.message.edit_text(
         "Выберите упаковку:",
@@ -135,28 +205,32 @@ async def choose_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return CHOOSING_PACKAGING
 
+def extras_keyboard(extras):
+    urgent = f"Срочно (+{pricing.URGENT_PRICE}₽)"
+    card = f"Открытка (+{pricing.CARD_PRICE}₽)"
+    return [
+        [InlineKeyboardButton(("✅ " if extras.get('urgent') else "⚡️ ") + urgent, callback_data="extra:urgent")],
+        [InlineKeyboardButton(("✅ " if extras.get('card') else "💌 ") + card, callback_data="extra:card")],
+        [InlineKeyboardButton("Продолжить ➡️", callback_data="extra:done")]
+    ]
+
 async def choose_packaging(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    _, pkg_type, pkg_price = query.data.split(":")
-    context.user_data['order']['packaging'] = {'type': pkg_type, 'price': int(pkg_price)}
+    pkg_type = query.data.split(":")[1]
+    table = pricing.price_table(context.user_data['bouquet']['id'])
+    # Упаковки, которой нет в таблице цен, не бывает - кнопка устарела или подделана
+    if table is None or pkg_type not in table['packaging']:
+        return await bouquet_gone(query.message, context)
+    price = table['packaging'][pkg_type]
+    context.user_data['order']['packaging'] = {'type': pkg_type, 'price': price}
     
     # Инициализируем extras
     if 'extras' not in context.user_data['order']:
         context.user_data['order']['extras'] = {'urgent': False, 'card': False}
     
-    keyboard = [
-        [InlineKeyboardButton(
-            "✅ Срочно (+1000₽)" if context.user_data['order']['extras'].get('urgent') else "⚡️ Срочно (+1000₽)",
-            callback_data="extra:urgent"
-        )],
-        [InlineKeyboardButton(
-            "✅ Открытка (+100₽)" if context.user_data['order']['extras'].get('card') else "💌 Открытка (+100₽)",
-            callback_data="extra:card"
-        )],
-        [InlineKeyboardButton("Продолжить ➡️", callback_data="extra:done")]
-    ]
+    keyboard = extras_keyboard(context.user_data['order']['extras'])
     
     await query.message.edit_text(
         "Дополнительные услуги:",
@@ -175,17 +249,7 @@ async def choose_extras(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("✅ Срочный заказ " + ("добавлен" if context.user_data['order']['extras']['urgent'] else "убран"))
         
         # Обновляем кнопки
-        keyboard = [
-            [InlineKeyboardButton(
-                "✅ Срочно (+1000₽)" if context.user_data['order']['extras'].get('urgent') else "⚡️ Срочно (+1000₽)",
-                callback_data="extra:urgent"
-            )],
-            [InlineKeyboardButton(
-                "✅ Открытка (+100₽)" if context.user_data['order']['extras'].get('card') else "💌 Открытка (+100₽)",
-                callback_data="extra:card"
-            )],
-            [InlineKeyboardButton("Продолжить ➡️", callback_data="extra:done")]
-        ]
+        keyboard = extras_keyboard(context.user_data['order']['extras'])
         
         await query.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
         return CHOOSING_EXTRAS
@@ -385,18 +449,22 @@ async def enter_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 async def show_summary(message, context):
-    bouquet = context.user_data['bouquet']
+    # Итог - по текущему каталогу: цены могли поменять, пока шёл заказ
+    bouquet = await current_bouquet(context)
     order = context.user_data['order']
-    
-    total = order['base_price'] + order['packaging']['price']
+    try:
+        if bouquet is None:
+            raise KeyError(context.user_data['bouquet']['id'])
+        total = pricing.item_total(bouquet['id'], order['quantity'], order['packaging']['type'], order.get('extras', {}))
+    except KeyError:
+        await bouquet_gone(message, context)
+        return
     
     extras_text = ""
     if order.get('extras', {}).get('urgent'):
-        total += 1000
         extras_text += "⚡️ Срочный заказ\n"
     
     if order.get('extras', {}).get('card_text'):
-        total += 100
         extras_text += f"💌 Открытка: {order['extras']['card_text']}\n"
     
     order['total_price'] = total
@@ -443,20 +511,36 @@ async def confirm_add_to_cart(update: Update, context: ContextTypes.DEFAULT_TYPE
         'total_price': order['total_price']
     }
     
-    db.add_to_cart(update.effective_user.id, item)
+    await db.aadd_to_cart(update.effective_user.id, item)
+    # Админам уходит сводкой в фоне - покупатель отправки не ждёт
+    notifications.notify(context.application, notifications.cart_text(update.effective_user, item))
     await query.message.edit_text("✅ Товар добавлен в корзину!")
     context.user_data.clear()
 
+def cart_item_price(item, bouquet):
+    """Цена позиции корзины; для удалённого букета, снятого количества или упаковки - цена на момент добавления"""
+    if bouquet is None:
+        return item['total_price']
+    packaging = item.get('packaging') or {}
+    try:
+        return pricing.item_total(bouquet['id'], item['quantity'], packaging.get('type'), item.get('extras', {}))
+    except KeyError:
+        return item['total_price']
+
 async def show_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cart = db.get_user_cart(update.effective_user.id)
+    cart = await db.aget_user_cart(update.effective_user.id)
     
     if not cart:
         await update.message.reply_text("Корзина пуста")
         return
     
+    # Цены по текущей таблице: корзина ещё не оплачена
+    bouquets = {b['id']: b for b in await db.aget_bouquets()}
+    
     total = 0
     for i, item in enumerate(cart):
-        total += item['total_price']
+        price = cart_item_price(item, bouquets.get(item['bouquet_id']))
+        total += price
         
         extras = []
         if item.get('extras', {}).get('urgent'):
@@ -471,7 +555,7 @@ async def show_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"🔢 {item['quantity']} роз{extras_text}\n"
             f"📅 {item['date']} в {item['time']}\n"
             f"📍 {item.get('address', 'Самовывоз')}\n"
-            f"💰 {item['total_price']}₽"
+            f"💰 {price}₽"
         )
         
         keyboard = [[InlineKeyboardButton("🗑 Удалить", callback_data=f"remove:{i}")]]
@@ -498,59 +582,80 @@ async def remove_from_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer("Удалено")
     
     index = int(query.data.split(":")[1])
-    db.remove_from_cart(update.effective_user.id, index)
+    await db.aremove_from_cart(update.effective_user.id, index)
     await query.message.edit_text("🗑 Товар удален")
 
 async def clear_cart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    db.clear_cart(update.effective_user.id)
+    await db.aclear_cart(update.effective_user.id)
     await query.message.edit_text("🗑 Корзина очищена")
 
 async def toggle_fav(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
     bouquet_id = query.data.split(":")[1]
-    db.toggle_favorite(update.effective_user.id, bouquet_id)
+    await db.atoggle_favorite(update.effective_user.id, bouquet_id)
     
-    favorites = db.get_favorites(update.effective_user.id)
+    favorites = await db.aget_favorite_set(update.effective_user.id)
     is_fav = bouquet_id in favorites
     
     await query.answer("❤️ Добавлено" if is_fav else "Удалено")
+    
+    # Обновляем сердечко на карточке каталога, остальные кнопки не трогаем
+    markup = query.message.reply_markup if query.message else None
+    if markup and any(b.callback_data == query.data for row in markup.inline_keyboard for b in row):
+        keyboard = [
+            [
+                InlineKeyboardButton("❤️" if is_fav else "♡", callback_data=button.callback_data)
+                if button.callback_data == query.data else button
+                for button in row
+            ]
+            for row in markup.inline_keyboard
+        ]
+        await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
+
+def favorite_card(bouquet):
+    caption = f"⭐️ *{bouquet['name']}*\n{bouquet['base_price']}₽"
+    keyboard = [[InlineKeyboardButton("🛒 Заказать", callback_data=f"order:{bouquet['id']}")]]
+    return caption, InlineKeyboardMarkup(keyboard)
 
 async def show_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    favorites = db.get_favorites(update.effective_user.id)
+    favorites = await db.aget_favorites(update.effective_user.id)
     
     if not favorites:
         await update.message.reply_text("Избранное пусто")
         return
     
+    # Один запрос к хранилищу вместо отдельного на каждый букет
+    since = render.token()
+    bouquets = {b['id']: b for b in await db.aget_bouquets()}
+    
     for bid in favorites:
-        bouquet = db.get_bouquet_by_id(bid)
+        bouquet = bouquets.get(bid)
         if bouquet:
-            caption = f"⭐️ *{bouquet['name']}*\n{bouquet['base_price']}₽"
-            keyboard = [[InlineKeyboardButton("🛒 Заказать", callback_data=f"order:{bouquet['id']}")]]
+            caption, keyboard = render.cached(bid, 'favorite', lambda: favorite_card(bouquet), since)
             
             try:
-                with open(bouquet['image_path'], 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        reply_markup=InlineKeyboardMarkup(keyboard),
-                        parse_mode='Markdown'
-                    )
+                await reply_bouquet_photo(
+                    update.message,
+                    bouquet,
+                    caption=caption,
+                    reply_markup=keyboard,
+                    parse_mode='Markdown'
+                )
             except:
                 pass
 
 async def show_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    orders = db.get_user_orders(update.effective_user.id)
+    orders = await db.aget_user_orders(update.effective_user.id, limit=10)
     
     if not orders:
         await update.message.reply_text("У вас пока нет заказов")
         return
     
-    for order in orders[-10:]:
+    for order in orders:
         text = (
             f"📦 *Заказ #{order['order_id']}*\n"
             f"📅 {order['created_at'][:16]}\n"
@@ -577,6 +682,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 def register_handlers(application):
+    application.add_handler(TypeHandler(Update, track_user), group=-1)
     application.add_handler(CommandHandler("start", start))
     
     application.add_handler(MessageHandler(filters.Regex("🌹 Каталог"), catalog))
@@ -600,7 +706,9 @@ def register_handlers(application):
             ENTERING_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, enter_address)]
         },
         fallbacks=[CallbackQueryHandler(cancel, pattern="^cancel$")],
-        allow_reentry=True
+        allow_reentry=True,
+        name="order",
+        persistent=True
     )
     
     application.add_handler(conv_handler)
@@ -608,4 +716,6 @@ def register_handlers(application):
     application.add_handler(CallbackQueryHandler(confirm_add_to_cart, pattern="^confirm_cart$"))
     application.add_handler(CallbackQueryHandler(remove_from_cart, pattern="^remove:"))
     application.add_handler(CallbackQueryHandler(clear_cart_handler, pattern="^clear_cart$"))
-    application.add_handler(CallbackQueryHandler(toggle_fav, pattern="^fav:"))
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(toggle_fav, pattern="^fav:"))
+    application.add_handler(CallbackQueryHandler(catalog_page, pattern="^cat:"))
+    application.add_handler(CallbackQueryHandler(catalog_noop, pattern="^cat_noop$"))
\ No newline at end of file
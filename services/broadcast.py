@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import BROADCAST_CONCURRENCY, BROADCAST_RATE
+from database import db
+from services.media import photo_for, remember_photo
+from services.ratelimit import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# Состояние рассылки на диске: после рестарта она продолжается с места
+# остановки. Получатели идут по возрастанию user_id, а в файле хранится
+# последний обработанный id - при падении повторно получат сообщение
+# не больше BROADCAST_CONCURRENCY человек.
+CHECKPOINT_FILE = 'broadcast.json'
+PROGRESS_INTERVAL = 5
+
+# starting - рассылка уже запускается (start ещё не дошёл до _launch):
+# место занято до первого await, так что двойное подтверждение или два
+# админа сразу не запустят две рассылки
+_job = {'task': None, 'stop': False, 'starting': False}
+
+def _checkpoint_path():
+    return os.path.join(db.DATA_DIR, CHECKPOINT_FILE)
+
+def load_checkpoint():
+    try:
+        with open(_checkpoint_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_checkpoint(state):
+    path = _checkpoint_path()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _remove_checkpoint():
+    try:
+        os.remove(_checkpoint_path())
+    except FileNotFoundError:
+        pass
+
+def is_running():
+    return _job['starting'] or (_job['task'] is not None and not _job['task'].done())
+
+def promo_caption(bouquet):
+    return f"🌹 *{bouquet['name']}*\n\n💰 {bouquet['base_price']}₽"
+
+def promo_keyboard(bouquet):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🛒 Заказать", callback_data=f"order:{bouquet['id']}")]])
+
+def _progress_text(state, title):
+    return (
+        f"📣 *Рассылка {title}*\n\n"
+        f"Отправлено: {state['sent']} из {state['total']}\n"
+        f"Заблокировали бота (удалены): {state['blocked']}\n"
+        f"Ошибок: {state['failed']}"
+    )
+
+async def _report(bot, state, title, running=True):
+    keyboard = [[InlineKeyboardButton("⏹ Остановить", callback_data="broadcast_stop")]] if running else []
+    try:
+        await bot.edit_message_text(
+            _progress_text(state, title),
+            chat_id=state['admin_chat_id'],
+            message_id=state['progress_message_id'],
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    except TelegramError as e:
+        if 'not modified' not in str(e):
+            logger.warning(f"Прогресс рассылки не обновлён: {e}")
+
+async def start(application, content, admin_chat_id):
+    """Запустить рассылку всем пользователям реестра.
+
+    content: {'kind': 'copy', 'from_chat_id', 'message_id'} - копия сообщения админа,
+    или {'kind': 'bouquet', 'bouquet_id'} - промо букета с кнопкой заказа.
+    """
+    if is_running():
+        raise RuntimeError("Рассылка уже идёт")
+    # Состояние прерванной и не продолженной рассылки (см. discard)
+    # просто заменяется новым
+    _job['starting'] = True
+    try:
+        await _start(application, content, admin_chat_id)
+    finally:
+        _job['starting'] = False
+
+async def _start(application, content, admin_chat_id):
+    users = await db.aget_users()
+    state = {
+        'content': content,
+        'admin_chat_id': admin_chat_id,
+        'progress_message_id': None,
+        'started_at': datetime.now().isoformat(),
+        'total': len(users),
+        'cursor': None,
+        'sent': 0,
+        'blocked': 0,
+        'failed': 0
+    }
+    message = await application.bot.send_message(admin_chat_id, _progress_text(state, "запущена"),
+                                                 parse_mode='Markdown')
+    state['progress_message_id'] = message.message_id
+    await asyncio.to_thread(_save_checkpoint, state)
+    _launch(application, state)
+
+def resume(application):
+    """Продолжить рассылку, прерванную остановкой бота"""
+    state = load_checkpoint()
+    if state is None or is_running():
+        return False
+    logger.info(f"Рассылка продолжается: отправлено {state['sent']} из {state['total']}")
+    _launch(application, state)
+    return True
+
+def discard():
+    """Забыть прерванную рассылку, не продолжая её; False, если она идёт"""
+    if is_running():
+        return False
+    _remove_checkpoint()
+    return True
+
+def stop():
+    """Остановить рассылку после текущей пачки; False, если её нет"""
+    if not is_running():
+        return False
+    _job['stop'] = True
+    return True
+
+async def shutdown():
+    # Состояние на диске остаётся - после рестарта рассылка продолжится
+    task = _job['task']
+    if task:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        _job['task'] = None
+
+def _launch(application, state):
+    _job['stop'] = False
+    # Не application.create_task: Application.stop() ждал бы конца рассылки
+    _job['task'] = asyncio.create_task(_run(application, state))
+    _job['task'].add_done_callback(_log_failure)
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"Рассылка прервана ошибкой: {task.exception()}")
+
+async def _send(bot, content, user_id, media, extra):
+    """Отправить одному получателю: 'sent', 'blocked' или 'failed'"""
+    for attempt in range(2):
+        try:
+            if content['kind'] == 'copy':
+                await bot.copy_message(user_id, content['from_chat_id'], content['message_id'], **extra)
+            else:
+                sent = await bot.send_photo(
+                    user_id, media['photo'],
+                    caption=promo_caption(media['bouquet']),
+                    reply_markup=promo_keyboard(media['bouquet']),
+                    parse_mode='Markdown',
+                    **extra
+                )
+                if not isinstance(media['photo'], str):
+                    # Файл загружен - дальше отправляем по file_id
+                    await remember_photo(media['bouquet'], media['digest'], sent)
+                    media['photo'] = sent.photo[-1].file_id
+            return 'sent'
+        except RetryAfter as e:
+            # Сюда попадаем только без общей очереди (OUTBOUND_RATE=0)
+            await asyncio.sleep(e.retry_after)
+        except Forbidden:
+            # Заблокировал бота или удалил аккаунт
+            return 'blocked'
+        except BadRequest as e:
+            if 'chat not found' in str(e).lower():
+                return 'blocked'
+            logger.warning(f"Рассылка: {user_id} не получил сообщение: {e}")
+            return 'failed'
+        except TelegramError as e:
+            logger.warning(f"Рассылка: {user_id} не получил сообщение: {e}")
+            return 'failed'
+    return 'failed'
+
+async def _run(application, state):
+    bot = application.bot
+    loop = asyncio.get_running_loop()
+    # Через общую очередь - в последнюю очередь, после ответов покупателям
+    extra = {'rate_limit_args': PRIORITY_BULK} if bot.rate_limiter else {}
+
+    media = None
+    content = state['content']
+    if content['kind'] == 'bouquet':
+        bouquet = await db.aget_bouquet_by_id(content['bouquet_id'])
+        if bouquet is None:
+            await asyncio.to_thread(_remove_checkpoint)
+            await _report(bot, state, "отменена: букет удалён", running=False)
+            return
+        photo, digest = await photo_for(bouquet)
+        media = {'bouquet': bouquet, 'photo': photo, 'digest': digest}
+
+    user_ids = sorted(u['user_id'] for u in await db.aget_users())
+    if state['cursor'] is not None:
+        user_ids = [user_id for user_id in user_ids if user_id > state['cursor']]
+
+    await _report(bot, state, "идёт")
+    reported_at = loop.time()
+    for i in range(0, len(user_ids), BROADCAST_CONCURRENCY):
+        if _job['stop']:
+            await asyncio.to_thread(_remove_checkpoint)
+            await _report(bot, state, "остановлена", running=False)
+            return
+
+        started = loop.time()
+        batch = user_ids[i:i + BROADCAST_CONCURRENCY]
+        results = []
+        pending = list(batch)
+        # Пока фото нет в Telegram, отправляем по одному - иначе каждый
+        # параллельный запрос пачки загрузил бы файл заново
+        while pending and media and not isinstance(media['photo'], str):
+            results.append(await _send(bot, content, pending.pop(0), media, extra))
+        results += await asyncio.gather(*(_send(bot, content, user_id, media, extra) for user_id in pending))
+        for user_id, result in zip(batch, results):
+            state[result] += 1
+            if result == 'blocked':
+                await db.adelete_user(user_id)
+
+        state['cursor'] = batch[-1]
+        await asyncio.to_thread(_save_checkpoint, state)
+
+        if loop.time() - reported_at >= PROGRESS_INTERVAL:
+            await _report(bot, state, "идёт")
+            reported_at = loop.time()
+
+        # Не быстрее BROADCAST_RATE сообщений в секунду
+        pause = len(batch) / BROADCAST_RATE - (loop.time() - started)
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    await asyncio.to_thread(_remove_checkpoint)
+    await _report(bot, state, "завершена ✅", running=False)
+    logger.info(f"Рассылка завершена: {state}")
@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - отправляются исходные файлы
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Варианты картинки: имя -> (максимальная сторона, качество JPEG).
+# Telegram всё равно показывает фото не больше 1280 px по длинной стороне.
+# thumb - маленькая миниатюра букета (thumbnail_path). В чат и в кэш
+# file_id идёт только display.
+VARIANTS = {
+    'display': (1280, 85),
+    'thumb': (320, 75),
+}
+
+# Один фоновый поток: обработка не мешает ответам бота и не грузит все ядра
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='images')
+
+def variant_path(path, variant):
+    """images/b8.jpg -> images/display/b8.jpg"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, variant, os.path.splitext(name)[0] + '.jpg')
+
+def _fresh(source, target):
+    try:
+        return os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def display_path(path):
+    """Путь к облегчённому варианту для отправки; исходный файл, если варианта ещё нет"""
+    target = variant_path(path, 'display')
+    return target if _fresh(path, target) else path
+
+def thumbnail_path(path):
+    """Путь к миниатюре букета или None, если её ещё нет"""
+    target = variant_path(path, 'thumb')
+    return target if _fresh(path, target) else None
+
+def optimize_image(path, force=False):
+    """Создать варианты картинки; возвращает {вариант: размер в байтах} или {} если нечего делать"""
+    if Image is None:
+        return {}
+    if not force and all(_fresh(path, variant_path(path, v)) for v in VARIANTS):
+        return {}
+
+    with Image.open(path) as source:
+        source_format = source.format
+        # Поворот по EXIF применяем к пикселям - сами метаданные не сохраняются
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    source_size = os.path.getsize(path)
+
+    sizes = {}
+    for variant, (max_side, quality) in VARIANTS.items():
+        target = variant_path(path, variant)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        # Атомарная замена, чтобы отправка не прочитала недописанный файл
+        tmp_path = target + '.tmp'
+        resized.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+        if (source_format == 'JPEG' and resized.size == image.size
+                and os.path.getsize(tmp_path) >= source_size):
+            # Уже небольшой JPEG: пережатие его только раздуло бы
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        sizes[variant] = os.path.getsize(target)
+
+    logger.info(f"Картинка {path}: {source_size} -> {sizes} байт")
+    return sizes
+
+def _log_failure(future):
+    error = future.exception()
+    if error:
+        logger.error(f"Ошибка обработки картинки: {error}")
+
+def schedule_optimize(path):
+    """Обработать картинку в фоне (например, сразу после загрузки нового букета)"""
+    if Image is None:
+        return None
+    future = _executor.submit(optimize_image, path)
+    future.add_done_callback(_log_failure)
+    return future
+
+def optimize_all(paths, force=False):
+    """Пакетная обработка: {'processed', 'skipped', 'failed', 'bytes_before', 'bytes_after'}"""
+    result = {'processed': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    for path in paths:
+        try:
+            sizes = optimize_image(path, force=force)
+        except Exception as e:
+            logger.error(f"Картинка {path} не обработана: {e}")
+            result['failed'] += 1
+            continue
+        if not sizes:
+            result['skipped'] += 1
+            continue
+        result['processed'] += 1
+        result['bytes_before'] += os.path.getsize(path)
+        result['bytes_after'] += sizes['display']
+    return result
+
+async def aoptimize_all(paths, force=False):
+    # В том же фоновом потоке, что и обработка новых букетов
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(optimize_all, paths, force))
+
+def available():
+    return Image is not None
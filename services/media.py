@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+from database import db
+from services.images import display_path
+
+logger = logging.getLogger(__name__)
+
+# Хэши картинок: путь -> (mtime_ns, size, hash), файл перечитывается только при изменении
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+def image_hash(path):
+    """Хэш содержимого картинки (кэшируется по mtime и размеру файла)"""
+    st = os.stat(path)
+    with _hashes_lock:
+        entry = _hashes.get(path)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+    
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    
+    with _hashes_lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _photo_source(bouquet):
+    # Облегчённый вариант, если он уже готов; иначе исходный файл.
+    # Хэш у вариантов разный, так что после обработки file_id обновится сам.
+    path = display_path(bouquet['image_path'])
+    return path, image_hash(path)
+
+async def photo_for(bouquet):
+    """Что отправлять в качестве фото: (file_id или байты файла, хэш картинки)"""
+    path, digest = await asyncio.to_thread(_photo_source, bouquet)
+    file_id = await db.aget_photo_file_id(bouquet['id'], digest)
+    if file_id:
+        return file_id, digest
+    return await asyncio.to_thread(_read_file, path), digest
+
+async def _photo_bytes(bouquet):
+    path, _ = await asyncio.to_thread(_photo_source, bouquet)
+    return await asyncio.to_thread(_read_file, path)
+
+async def remember_photo(bouquet, digest, message):
+    """Запомнить file_id, который Telegram вернул после загрузки"""
+    if message and message.photo:
+        await db.aset_photo_file_id(bouquet['id'], digest, message.photo[-1].file_id)
+
+async def reply_bouquet_photo(message, bouquet, **kwargs):
+    """Отправить фото букета, по возможности без повторной загрузки файла"""
+    photo, digest = await photo_for(bouquet)
+    
+    if isinstance(photo, str):
+        try:
+            return await message.reply_photo(photo=photo, **kwargs)
+        except BadRequest as e:
+            # file_id мог устареть (например, сменился токен бота) - загружаем заново
+            logger.warning(f"file_id для {bouquet['id']} не принят: {e}")
+            await db.aforget_photo_file_id(bouquet['id'])
+            photo = await _photo_bytes(bouquet)
+    
+    sent = await message.reply_photo(photo=photo, **kwargs)
+    await remember_photo(bouquet, digest, sent)
+    return sent
+
+async def edit_bouquet_photo(query, bouquet, caption, reply_markup=None, parse_mode=None):
+    """Заменить фото и подпись в сообщении с кнопками (карусель каталога)"""
+    photo, digest = await photo_for(bouquet)
+    
+    if isinstance(photo, str):
+        try:
+            return await query.edit_message_media(
+                media=InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode),
+                reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            if 'not modified' in str(e):
+                raise
+            logger.warning(f"file_id для {bouquet['id']} не принят: {e}")
+            await db.aforget_photo_file_id(bouquet['id'])
+            photo = await _photo_bytes(bouquet)
+    
+    edited = await query.edit_message_media(
+        media=InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode),
+        reply_markup=reply_markup
+    )
+    if edited is not True:
+        await remember_photo(bouquet, digest, edited)
+    return edited
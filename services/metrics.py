@@ -0,0 +1,223 @@
+import asyncio
+import bisect
+import functools
+import logging
+import sys
+import threading
+import time
+
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+
+from services.webhook import read_request
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IO_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# Метрики пишутся из цикла событий и из потоков хранилища
+_lock = threading.Lock()
+_metrics = {}
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # метки -> [счётчики по корзинам (+ последняя +Inf), сумма]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        with _lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def samples(self):
+        for label_values, (counts, total) in self.values.items():
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield f"{self.name}_bucket", dict(labels, le=le), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+def counter(name, help_text, labels=()):
+    return _metrics.setdefault(name, Counter(name, help_text, labels))
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return _metrics.setdefault(name, Histogram(name, help_text, labels, buckets))
+
+# Значения, которые считаются в момент сбора: name -> (help, функция -> {метки: значение})
+_gauges = {}
+
+def gauge(name, help_text, collect):
+    _gauges[name] = (help_text, collect)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format(name, labels, value):
+    if labels:
+        body = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{body}}} {value}"
+    return f"{name} {value}"
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    with _lock:
+        for metric in _metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format(*sample) for sample in metric.samples())
+    for name, (help_text, collect) in _gauges.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        try:
+            for labels, value in collect().items():
+                lines.append(_format(name, dict(labels), value))
+        except Exception as e:
+            logger.warning(f"Метрика {name} не собрана: {e}")
+    return '\n'.join(lines) + '\n'
+
+# Хендлеры
+
+handler_calls = counter('bot_handler_calls_total', "Вызовы хендлеров", ('handler', 'conversation', 'state'))
+handler_errors = counter('bot_handler_errors_total', "Исключения в хендлерах", ('handler', 'conversation', 'state'))
+handler_latency = histogram('bot_handler_latency_seconds', "Время работы хендлера",
+                            ('handler', 'conversation', 'state'))
+
+def _wrap_callback(handler, conversation, state):
+    callback = handler.callback
+    labels = (getattr(callback, '__name__', type(handler).__name__), conversation, state)
+
+    @functools.wraps(callback)
+    async def timed(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handler_errors.inc(*labels)
+            raise
+        finally:
+            handler_calls.inc(*labels)
+            handler_latency.observe(time.perf_counter() - started, *labels)
+
+    handler.callback = timed
+
+def _state_names(module_name):
+    """Имена состояний диалога по константам модуля: {значение: ИМЯ}"""
+    names = {}
+    for name, value in vars(sys.modules.get(module_name, object)).items():
+        if name.isupper() and isinstance(value, int) and not isinstance(value, bool):
+            names.setdefault(value, name)
+    return names
+
+def instrument_handlers(application):
+    """Обернуть колбэки всех зарегистрированных хендлеров (в том числе внутри диалогов)"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not isinstance(handler, ConversationHandler):
+                _wrap_callback(handler, '', '')
+                continue
+
+            entry = handler.entry_points[0].callback
+            conversation = handler.name or entry.__name__
+            names = _state_names(entry.__module__)
+            for h in handler.entry_points:
+                _wrap_callback(h, conversation, 'entry')
+            for state, state_handlers in handler.states.items():
+                for h in state_handlers:
+                    _wrap_callback(h, conversation, names.get(state, str(state)))
+            for h in handler.fallbacks:
+                _wrap_callback(h, conversation, 'fallback')
+
+# Хранилище
+
+storage_calls = counter('bot_storage_io_total', "Чтения и записи файлов хранилища", ('op', 'file'))
+storage_bytes = counter('bot_storage_io_bytes_total', "Байт прочитано/записано с диска", ('op', 'file'))
+storage_latency = histogram('bot_storage_io_seconds', "Время чтения/записи файла хранилища",
+                            ('op', 'file'), IO_BUCKETS)
+
+def observe_storage_io(op, filename, nbytes, seconds):
+    """Подписчик для db.add_io_hook"""
+    storage_calls.inc(op, filename)
+    storage_bytes.inc(op, filename, amount=nbytes)
+    storage_latency.observe(seconds, op, filename)
+
+# Исходящие запросы к Bot API
+
+api_calls = counter('bot_api_requests_total', "Запросы к Bot API", ('method', 'status'))
+api_latency = histogram('bot_api_latency_seconds', "Время запроса к Bot API", ('method',))
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который считает запросы и время по методам Bot API"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+            status = str(code)
+            return code, payload
+        finally:
+            api_calls.inc(api_method, status)
+            api_latency.observe(time.perf_counter() - started, api_method)
+
+# HTTP-эндпоинт
+
+async def _handle_connection(reader, writer):
+    try:
+        request = await read_request(reader)
+        if request is None:
+            return
+        method, path, _, _ = request
+        if method == 'GET' and path.split('?', 1)[0] == '/metrics':
+            status, body = '200 OK', render().encode('utf-8')
+        else:
+            status, body = '404 Not Found', b''
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def start_server(listen, port):
+    """Поднять /metrics; возвращает asyncio.Server (закрыть при остановке)"""
+    server = await asyncio.start_server(_handle_connection, listen, port)
+    logger.info(f"Метрики: http://{listen}:{server.sockets[0].getsockname()[1]}/metrics")
+    return server
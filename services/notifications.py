@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+from telegram.error import TelegramError
+
+from config import ADMIN_IDS, ADMIN_NOTIFY_WINDOW
+from database import db
+from services.ratelimit import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины сообщения Telegram - 4096 символов, берём с запасом
+MAX_MESSAGE_LENGTH = 4000
+
+# События копятся ADMIN_NOTIFY_WINDOW секунд с первого и уходят каждому
+# админу одной сводкой: наплыв заказов не превращается в десятки сообщений.
+_pending = []
+_flush = {'task': None, 'application': None}
+# Отправки, уже вышедшие из окна: при остановке бота их дожидаемся
+_sending = set()
+
+def notify(application, text):
+    """Поставить уведомление админам в очередь (не ждёт отправки)"""
+    _pending.append(text)
+    if _flush['task'] is None:
+        _flush['application'] = application
+        # Не application.create_task: Application.stop() ждал бы конца окна
+        _flush['task'] = asyncio.create_task(_flush_later())
+
+def cart_text(user, item):
+    extras = []
+    if item.get('extras', {}).get('urgent'):
+        extras.append("срочно")
+    if item.get('extras', {}).get('card_text'):
+        extras.append("открытка")
+    name = f"@{user.username}" if user.username else user.full_name
+    return (
+        f"🛒 {name} (id {user.id}): {item['bouquet_name']}, {item['quantity']} роз"
+        f"{' (' + ', '.join(extras) + ')' if extras else ''}\n"
+        f"📅 {item['date']} в {item['time']}, {item.get('address', 'Самовывоз')}\n"
+        f"💰 {item['total_price']}₽"
+    )
+
+def digest_messages(events):
+    """Тексты сообщений сводки: события целиком, не длиннее MAX_MESSAGE_LENGTH"""
+    header = f"🔔 Новых событий: {len(events)}\n\n" if len(events) > 1 else ""
+    messages = []
+    current = header
+    for text in events:
+        if current and len(current) + len(text) + 2 > MAX_MESSAGE_LENGTH:
+            messages.append(current.rstrip())
+            current = ""
+        current += text[:MAX_MESSAGE_LENGTH] + "\n\n"
+    messages.append(current.rstrip())
+    return messages
+
+async def _flush_later():
+    await asyncio.sleep(ADMIN_NOTIFY_WINDOW)
+    # Новые события после этой точки попадут в следующее окно
+    task = asyncio.current_task()
+    _flush['task'] = None
+    _sending.add(task)
+    try:
+        await _send_pending(_flush['application'])
+    finally:
+        _sending.discard(task)
+
+async def _send_pending(application):
+    events = _pending[:]
+    _pending.clear()
+    if not events:
+        return
+
+    bot = application.bot
+    extra = {'rate_limit_args': PRIORITY_BULK} if bot.rate_limiter else {}
+    admins = set(ADMIN_IDS)
+    try:
+        admins.update(await db.aget_admin_ids())
+    except Exception as e:
+        logger.error(f"Не удалось прочитать список админов: {e}")
+
+    messages = digest_messages(events)
+    await asyncio.gather(*(_send_digest(bot, admin_id, messages, extra) for admin_id in admins))
+
+async def _send_digest(bot, admin_id, messages, extra):
+    for text in messages:
+        try:
+            await bot.send_message(admin_id, text, **extra)
+        except TelegramError as e:
+            # Админ мог ни разу не запускать бота или заблокировать его
+            logger.warning(f"Уведомление админу {admin_id} не доставлено: {e}")
+            return
+
+async def shutdown():
+    """Отправить накопленное сразу, не дожидаясь конца окна"""
+    task = _flush['task']
+    if task:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        _flush['task'] = None
+    await asyncio.gather(*_sending, return_exceptions=True)
+    if _pending and _flush['application']:
+        await _send_pending(_flush['application'])
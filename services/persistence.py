@@ -0,0 +1,192 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Незаконченные заказы (context.user_data) и состояния диалогов переживают
+# рестарт. Снимок sessions.json + журнал sessions.jsonl: PTB раз в
+# update_interval отдаёт только тех, кто успел что-то сделать, из них
+# в журнал уходят лишь реально изменившиеся - одной записью на проход.
+SNAPSHOT_FILE = 'sessions.json'
+JOURNAL_FILE = 'sessions.jsonl'
+COMPACT_EVERY = 500
+
+def _encode_key(key):
+    return list(key)
+
+def _decode_key(key):
+    return tuple(key)
+
+class JournalPersistence(BasePersistence):
+    """user_data и состояния ConversationHandler в DATA_DIR (bot_data и chat_data не нужны)"""
+
+    def __init__(self, update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # То, что уже лежит на диске: user_id -> data, имя диалога -> {ключ: состояние}
+        self._users = None
+        self._conversations = None
+        # Изменения, ещё не записанные в журнал (None - удалить)
+        self._pending_users = {}
+        self._pending_conversations = {}
+        self._write_lock = asyncio.Lock()
+
+    def _snapshot_path(self):
+        return os.path.join(db.DATA_DIR, SNAPSHOT_FILE)
+
+    def _read(self):
+        try:
+            with open(self._snapshot_path(), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = {}
+
+        users = {int(user_id): data for user_id, data in snapshot.get('users', {}).items()}
+        conversations = {
+            name: {_decode_key(key): state for key, state in states}
+            for name, states in snapshot.get('conversations', {}).items()
+        }
+        records = db.read_journal(JOURNAL_FILE)
+        for record in records:
+            self._apply(users, conversations, record)
+        return users, conversations, len(records)
+
+    @staticmethod
+    def _apply(users, conversations, record):
+        for user_id, data in record.get('users', {}).items():
+            if data is None:
+                users.pop(int(user_id), None)
+            else:
+                users[int(user_id)] = data
+        for name, states in record.get('conversations', {}).items():
+            conversation = conversations.setdefault(name, {})
+            for key, state in states:
+                if state is None:
+                    conversation.pop(_decode_key(key), None)
+                else:
+                    conversation[_decode_key(key)] = state
+
+    async def _load(self):
+        if self._users is None:
+            self._users, self._conversations, records = await asyncio.to_thread(self._read)
+            logger.info(f"Сессии восстановлены: {len(self._users)} пользователей, журнал {records} записей")
+
+    def _append(self, record):
+        db.append_journal(JOURNAL_FILE, record)
+        if len(db.read_journal(JOURNAL_FILE)) >= COMPACT_EVERY:
+            self._compact()
+
+    def _compact(self):
+        """Перенести журнал в снимок sessions.json"""
+        snapshot = {
+            'users': {str(user_id): data for user_id, data in self._users.items()},
+            'conversations': {
+                name: [[_encode_key(key), state] for key, state in states.items()]
+                for name, states in self._conversations.items()
+            }
+        }
+        path = self._snapshot_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        db.truncate_journal(JOURNAL_FILE)
+
+    async def _write(self):
+        async with self._write_lock:
+            # Остальные обновления этого прохода (PTB запускает их разом
+            # через gather) успевают встать в ту же запись
+            await asyncio.sleep(0)
+            if not self._pending_users and not self._pending_conversations:
+                return
+            record = {}
+            if self._pending_users:
+                record['users'] = {str(user_id): data for user_id, data in self._pending_users.items()}
+            if self._pending_conversations:
+                record['conversations'] = {
+                    name: [[_encode_key(key), state] for key, state in states.items()]
+                    for name, states in self._pending_conversations.items()
+                }
+            self._pending_users = {}
+            self._pending_conversations = {}
+            # Вид в памяти меняется только здесь, под блокировкой - поток
+            # записи может спокойно читать его при сжатии
+            self._apply(self._users, self._conversations, record)
+            await asyncio.to_thread(self._append, record)
+
+    async def get_user_data(self):
+        await self._load()
+        # Копия: хендлеры меняют user_data на месте, а вид должен совпадать с диском
+        return copy.deepcopy(self._users)
+
+    async def get_conversations(self, name):
+        await self._load()
+        return dict(self._conversations.get(name, {}))
+
+    async def update_user_data(self, user_id, data):
+        # Пустой user_data не храним: после заказа или /cancel он очищается
+        stored = data or None
+        if self._users.get(user_id) == stored and user_id not in self._pending_users:
+            return
+        self._pending_users[user_id] = stored
+        await self._write()
+
+    async def drop_user_data(self, user_id):
+        self._pending_users[user_id] = None
+        await self._write()
+
+    async def update_conversation(self, name, key, new_state):
+        current = self._conversations.get(name, {}).get(key)
+        pending = self._pending_conversations.get(name, {})
+        if current == new_state and key not in pending:
+            return
+        self._pending_conversations.setdefault(name, {})[key] = new_state
+        await self._write()
+
+    async def flush(self):
+        """Последняя запись при остановке; журнал сразу сворачивается в снимок"""
+        await self._write()
+        if self._users is not None and db.read_journal(JOURNAL_FILE):
+            await asyncio.to_thread(self._compact)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    # bot_data, chat_data и callback_data не сохраняются (store_data выше),
+    # но BasePersistence требует эти методы
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
@@ -0,0 +1,97 @@
+import threading
+
+from database import db
+
+# Доплаты за дополнительные услуги
+URGENT_PRICE = 1000
+CARD_PRICE = 100
+
+# Таблицы цен по букетам: bouquet_id -> {'quantities': {роз: цена},
+# 'packaging': {тип: цена}}. Строятся только из каталога db (при загрузке
+# или первом обращении, по id) и сбрасываются, когда db сообщает об
+# изменении букета. _version растёт при каждом сбросе: таблица, которую
+# строили во время сброса, в кэш уже не попадает.
+_tables = {}
+_lock = threading.Lock()
+_version = {'value': 0}
+
+def compile_catalog(bouquets):
+    """Таблицы цен сразу для всего каталога: {bouquet_id: таблица}"""
+    # Все пары (база, множитель) каталога - плоскими списками, цены
+    # считаются одним проходом по ним
+    owners, values, bases, multipliers = [], [], [], []
+    for bouquet in bouquets:
+        for qty in bouquet.get('quantities', []):
+            owners.append(bouquet['id'])
+            values.append(qty['value'])
+            bases.append(bouquet['base_price'])
+            multipliers.append(qty['multiplier'])
+    # round, а не int: 4500 * 0.244444444 = 1099.99... - это 1100
+    prices = [round(base * multiplier) for base, multiplier in zip(bases, multipliers)]
+
+    tables = {
+        bouquet['id']: {
+            'quantities': {},
+            'packaging': {pkg['type']: pkg['price'] for pkg in bouquet.get('packaging', [])}
+        }
+        for bouquet in bouquets
+    }
+    for bouquet_id, value, price in zip(owners, values, prices):
+        tables[bouquet_id]['quantities'][value] = price
+    return tables
+
+def warm_up(bouquets):
+    tables = compile_catalog(bouquets)
+    with _lock:
+        _tables.update(tables)
+
+def price_table(bouquet_id):
+    """Таблица цен букета по текущему каталогу; None - букета больше нет"""
+    table = _tables.get(bouquet_id)
+    if table is not None:
+        return table
+    
+    version = _version['value']
+    bouquet = db.get_bouquet_by_id(bouquet_id)
+    if bouquet is None:
+        return None
+    table = compile_catalog([bouquet])[bouquet_id]
+    with _lock:
+        if _version['value'] == version:
+            _tables[bouquet_id] = table
+    return table
+
+def item_total(bouquet_id, quantity, packaging, extras):
+    """Цена позиции; KeyError, если букета, такого количества роз или упаковки больше нет"""
+    table = price_table(bouquet_id)
+    if table is None:
+        raise KeyError(bouquet_id)
+    total = table['quantities'][quantity] + table['packaging'][packaging]
+    if extras.get('urgent'):
+        total += URGENT_PRICE
+    if extras.get('card_text'):
+        total += CARD_PRICE
+    return total
+
+def scale_catalog(bouquets, percent):
+    """Новые базовые цены всего каталога (+percent%): {bouquet_id: {'base_price': цена}}.
+
+    Множители не меняются, так что все цены букета сдвигаются пропорционально.
+    Результат - одна запись через db.update_bouquets.
+    """
+    factor = 1 + percent / 100
+    bases = [bouquet['base_price'] for bouquet in bouquets]
+    new_bases = [max(1, round(base * factor)) for base in bases]
+    return {bouquet['id']: {'base_price': base} for bouquet, base in zip(bouquets, new_bases)}
+
+def invalidate(bouquet_ids=None):
+    with _lock:
+        _version['value'] += 1
+        if bouquet_ids is None:
+            _tables.clear()
+        else:
+            for bouquet_id in bouquet_ids:
+                _tables.pop(bouquet_id, None)
+
+# Изменения каталога приходят из потоков хранилища
+db.add_bouquet_hook(invalidate)
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Стек считается работой бота, если проходит через эти пакеты (bot.py не в счёт:
+# через его main() идёт и простаивающий цикл событий)
+PROFILED_DIRS = tuple(os.path.join(PROJECT_ROOT, name) + os.sep for name in ('handlers', 'database', 'services'))
+SAMPLE_INTERVAL = 0.005
+MAX_CAPTURE_SECONDS = 600
+# Группа счётчика апдейтов - после всех хендлеров бота
+HOOK_GROUP = 1000
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик: отдельный поток раз в interval снимает
+    стеки всех потоков (sys._current_frames). В профиль попадают только стеки,
+    проходящие через код бота - простаивающий цикл событий и ждущие потоки
+    пула не мешают."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.threads = Counter()
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.stacks = Counter()
+        self.started_at = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Поток-сэмплер получает GIL только при переключении потоков; с обычным
+        # интервалом (5 мс) сэмплы смещаются к местам, где код отпускает GIL
+        # (ввод-вывод). На время записи переключаемся чаще.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 10))
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(names.get(ident, str(ident)), frame)
+
+    def _sample(self, thread_name, frame):
+        stack = []
+        in_project = False
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            if not in_project and _is_project_file(code.co_filename):
+                in_project = True
+            frame = frame.f_back
+        if not in_project:
+            return
+
+        stack.reverse()
+        self.samples += 1
+        self.threads[thread_name] += 1
+        self.self_counts[stack[-1]] += 1
+        for key in set(stack):
+            self.total_counts[key] += 1
+        self.stacks[tuple(stack)] += 1
+
+    def report(self, top=30, title=''):
+        """Текстовый отчёт: горячие функции по собственному и полному времени"""
+        lines = [
+            f"Профиль {title}".rstrip(),
+            f"Сэмплов: {self.samples} за {self.elapsed:.1f} с (интервал {self.interval * 1000:.0f} мс)",
+            "Потоки: " + ", ".join(f"{name} {n}" for name, n in self.threads.most_common()),
+            ""
+        ]
+        if not self.samples:
+            lines.append("Код бота за время записи не выполнялся")
+            return '\n'.join(lines) + '\n'
+
+        for header, counts in (("Собственное время (где был сэмпл)", self.self_counts),
+                               ("Полное время (вместе с вызванными)", self.total_counts)):
+            lines.append(header + ":")
+            lines.append(f"{'%':>7} {'сэмплов':>8}  функция")
+            for key, n in counts.most_common(top):
+                lines.append(f"{n * 100 / self.samples:>6.1f}% {n:>8}  {_label(key)}")
+            lines.append("")
+
+        lines.append("Самые частые стеки:")
+        for stack, n in self.stacks.most_common(min(top, 10)):
+            lines.append(f"{n * 100 / self.samples:>6.1f}% {n:>8}")
+            for key in stack[-12:]:
+                lines.append(f"          {_label(key)}")
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        """Стеки в свёрнутом формате (flamegraph.pl, speedscope)"""
+        return ''.join(
+            ';'.join(_label(key) for key in stack) + f" {n}\n"
+            for stack, n in self.stacks.most_common()
+        )
+
+def _is_project_file(filename):
+    return filename.startswith(PROFILED_DIRS) and filename != __file__
+
+def _label(key):
+    filename, name, lineno = key
+    if filename.startswith(PROJECT_ROOT) and 'site-packages' not in filename:
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{name} ({filename}:{lineno})"
+
+# Одна запись профиля за раз. Пока записи нет - ни потока, ни хендлера.
+_session = None
+
+def is_running():
+    return _session is not None
+
+def _set_handlers(application, handlers):
+    # application.add_handler/remove_handler меняют словарь групп на месте, а
+    # апдейты в обработке в этот момент по нему итерируют - подменяем копией
+    application.handlers = dict(sorted(handlers.items()))
+
+def start_capture(application, chat_id, updates=None, seconds=None):
+    """Начать запись на updates апдейтов или seconds секунд; отчёт уйдёт в chat_id"""
+    global _session
+    if _session is not None:
+        raise RuntimeError("Профилирование уже идёт")
+
+    profiler = SamplingProfiler()
+    session = _session = {
+        'profiler': profiler,
+        'application': application,
+        'chat_id': chat_id,
+        'target': updates,
+        'updates': 0,
+        'hook': None,
+        'timer': None
+    }
+
+    if updates:
+        session['hook'] = TypeHandler(Update, _count_update)
+        handlers = dict(application.handlers)
+        handlers[HOOK_GROUP] = [session['hook']]
+        _set_handlers(application, handlers)
+
+    profiler.start()
+    session['timer'] = asyncio.create_task(_stop_later(session, min(seconds or MAX_CAPTURE_SECONDS, MAX_CAPTURE_SECONDS)))
+    logger.info(f"Профилирование запущено: апдейтов {updates or '-'}, секунд {seconds or '-'}")
+
+async def _count_update(update, context):
+    session = _session
+    if session is None:
+        return
+    session['updates'] += 1
+    if session['updates'] >= session['target']:
+        await finish_capture()
+
+async def _stop_later(session, seconds):
+    await asyncio.sleep(seconds)
+    if _session is session:
+        session['timer'] = None
+        await finish_capture()
+
+async def finish_capture():
+    """Остановить запись и отправить отчёт; False, если записи не было"""
+    global _session
+    session = _session
+    if session is None:
+        return False
+    _session = None
+
+    application = session['application']
+    if session['hook']:
+        handlers = dict(application.handlers)
+        handlers.pop(HOOK_GROUP, None)
+        _set_handlers(application, handlers)
+    if session['timer']:
+        session['timer'].cancel()
+
+    profiler = session['profiler']
+    await asyncio.to_thread(profiler.stop)
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    title = f"({session['updates']} апдейтов)" if session['target'] else ''
+    try:
+        await application.bot.send_document(
+            session['chat_id'],
+            document=profiler.report(title=title).encode('utf-8'),
+            filename=f"profile_{stamp}.txt",
+            caption=f"🔬 Профиль: {profiler.samples} сэмплов за {profiler.elapsed:.1f} с"
+        )
+        if profiler.samples:
+            await application.bot.send_document(
+                session['chat_id'],
+                document=profiler.collapsed().encode('utf-8'),
+                filename=f"profile_{stamp}.collapsed.txt"
+            )
+    except Exception as e:
+        logger.error(f"Не удалось отправить профиль: {e}")
+    return True
@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import logging
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих запросов (меньше - раньше). Явно задаются через
+# rate_limit_args=..., иначе выводятся из метода Bot API.
+PRIORITY_INTERACTIVE = 0  # ответы на кнопки и правки сообщений
+PRIORITY_NORMAL = 1       # текстовые ответы
+PRIORITY_MEDIA = 2        # фото и файлы (каталог, избранное)
+PRIORITY_BULK = 3         # рассылки и уведомления
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_NORMAL: 'normal',
+    PRIORITY_MEDIA: 'media',
+    PRIORITY_BULK: 'bulk',
+}
+
+# Ожидание, за которое запрос поднимается на один уровень приоритета:
+# при забитой очереди фото и рассылки не ждут бесконечно
+PRIORITY_AGING = 2.0
+
+INTERACTIVE_METHODS = {
+    'answerCallbackQuery', 'editMessageText', 'editMessageCaption', 'editMessageMedia',
+    'editMessageReplyMarkup', 'deleteMessage', 'sendChatAction',
+}
+# Ответ на нажатие кнопки - не сообщение: лимиты на сообщения (общий и
+# чата) на него не действуют, очередь он не ждёт (только паузу после 429)
+UNMETERED_METHODS = {'answerCallbackQuery'}
+MEDIA_METHODS = {
+    'sendPhoto', 'sendMediaGroup', 'sendDocument', 'sendVideo', 'sendAnimation', 'sendAudio',
+}
+
+queue_wait = metrics.histogram('bot_outbound_wait_seconds', "Ожидание запроса в очереди к Bot API",
+                               ('priority',), (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+retries = metrics.counter('bot_outbound_retries_total', "Повторы после RetryAfter (429)", ('method',))
+
+class TokenBucket:
+    """rate запросов в секунду, до burst подряд"""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд будет доступен запрос (0 - уже можно)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Единая очередь исходящих запросов к Bot API.
+
+    Соблюдает общий лимит бота и лимиты на чат (для групп строже, как
+    требует Telegram), пропускает вперёд интерактивные ответы и повторяет
+    запрос после RetryAfter, приостанавливая на это время всю отправку.
+
+    Интерактивные запросы в личный чат (правки сообщения, на кнопку которого
+    нажали), когда ведро чата пусто, берут из запасного ведра с теми же
+    rate и burst: ответ на нажатие не ждёт обычных сообщений этому чату,
+    а обычные сообщения не расплачиваются за правки.
+    """
+
+    def __init__(self, overall_rate=30, chat_rate=1, chat_burst=10, group_rate=20 / 60, group_burst=3,
+                 max_retries=3):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._pending = []
+        self._seq = itertools.count()
+        self._chats = {}
+        self._spare = {}
+        self._overall = None
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._task = None
+
+        metrics.gauge('bot_outbound_queue_depth', "Запросов к Bot API в очереди", self._queue_depth)
+
+    async def initialize(self):
+        # Вызывается дважды: из Application.initialize и Updater.initialize
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._overall = TokenBucket(self.overall_rate, self.overall_rate, loop.time())
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for entry in self._pending:
+            entry['future'].cancel()
+        self._pending.clear()
+
+    def _queue_depth(self):
+        depth = {(('priority', name),): 0 for name in PRIORITY_NAMES.values()}
+        for entry in self._pending:
+            depth[(('priority', PRIORITY_NAMES.get(entry['priority'], str(entry['priority']))),)] += 1
+        return depth
+
+    @staticmethod
+    def priority_for(endpoint, rate_limit_args):
+        if isinstance(rate_limit_args, int):
+            return rate_limit_args
+        if endpoint in INTERACTIVE_METHODS:
+            return PRIORITY_INTERACTIVE
+        if endpoint in MEDIA_METHODS:
+            return PRIORITY_MEDIA
+        return PRIORITY_NORMAL
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = self.priority_for(endpoint, rate_limit_args)
+        chat_id = data.get('chat_id')
+        seq = next(self._seq)
+
+        for attempt in range(self.max_retries + 1):
+            if endpoint in UNMETERED_METHODS:
+                await self._wait_pause()
+            else:
+                await self._acquire(priority, seq, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    logger.error(f"{endpoint}: лимит Telegram, попытки исчерпаны")
+                    raise
+                retries.inc(endpoint)
+                logger.warning(f"{endpoint}: лимит Telegram, пауза {e.retry_after} с")
+                # Повтор встаёт в очередь с прежним номером - впереди более поздних
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(self._paused_until, loop.time() + e.retry_after + 0.1)
+
+    async def _wait_pause(self):
+        loop = asyncio.get_running_loop()
+        while loop.time() < self._paused_until:
+            await asyncio.sleep(self._paused_until - loop.time())
+
+    async def _acquire(self, priority, seq, chat_id):
+        loop = asyncio.get_running_loop()
+        entry = {
+            'priority': priority,
+            'seq': seq,
+            'chat': chat_id,
+            'future': loop.create_future(),
+            'queued_at': loop.time()
+        }
+        self._pending.append(entry)
+        self._wakeup.set()
+        await entry['future']
+        queue_wait.observe(loop.time() - entry['queued_at'], PRIORITY_NAMES.get(priority, str(priority)))
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный id или @username - группа или канал
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            bucket = self._chats[chat_id] = TokenBucket(
+                self.group_rate if is_group else self.chat_rate,
+                self.group_burst if is_group else self.chat_burst,
+                now
+            )
+        return bucket
+
+    def _buckets(self, entry, now):
+        """Вёдра, из которых может взять запрос, по порядку"""
+        bucket = self._chat_bucket(entry['chat'], now)
+        if entry['priority'] != PRIORITY_INTERACTIVE or bucket.rate != self.chat_rate:
+            return [bucket]
+        spare = self._spare.get(entry['chat'])
+        if spare is None:
+            spare = self._spare[entry['chat']] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return [bucket, spare]
+
+    def _prune_chats(self, now):
+        # Полные вёдра ничего не ограничивают - их можно забыть
+        for buckets in (self._chats, self._spare):
+            for chat_id, bucket in list(buckets.items()):
+                if bucket.delay(now) == 0 and bucket.tokens >= bucket.burst:
+                    del buckets[chat_id]
+
+    async def _sleep(self, seconds):
+        """Поспать, но проснуться раньше, если пришёл новый запрос"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending = [e for e in self._pending if not e['future'].done()]
+            now = loop.time()
+
+            if not self._pending:
+                if len(self._chats) + len(self._spare) > 10000:
+                    self._prune_chats(now)
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            overall = self._overall.delay(now)
+            if overall:
+                await asyncio.sleep(overall)
+                continue
+
+            # Самый приоритетный запрос, чей чат сейчас не упирается в лимит
+            chosen = None
+            chosen_bucket = None
+            soonest = None
+            ordered = sorted(self._pending, key=lambda e: (
+                e['priority'] - int((now - e['queued_at']) / PRIORITY_AGING), e['seq']
+            ))
+            for entry in ordered:
+                if entry['chat'] is None:
+                    chosen = entry
+                    break
+                for bucket in self._buckets(entry, now):
+                    delay = bucket.delay(now)
+                    if delay == 0:
+                        chosen, chosen_bucket = entry, bucket
+                        break
+                    soonest = delay if soonest is None else min(soonest, delay)
+                if chosen is not None:
+                    break
+
+            if chosen is None:
+                await self._sleep(soonest)
+                continue
+
+            self._overall.take()
+            if chosen_bucket is not None:
+                chosen_bucket.take()
+            self._pending.remove(chosen)
+            chosen['future'].set_result(None)
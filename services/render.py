@@ -0,0 +1,59 @@
+import threading
+
+from database import db
+
+# Готовые подписи и клавиатуры по букетам: bouquet_id -> {ключ: объект}.
+# InlineKeyboardMarkup в PTB неизменяемый, так что один объект можно
+# отправлять сколько угодно раз. Записи букета сбрасываются, когда db
+# сообщает о его изменении (правка, новый заказ, удаление).
+#
+# Каждый сброс получает очередной номер _clock, а букет помнит номер
+# своего последнего сброса (весь кэш - _cleared). Объект, построенный по
+# данным, прочитанным до сброса, в кэш уже не попадает: вызывающий код
+# берёт token() до чтения букета из db и передаёт его в cached.
+_cache = {}
+_clock = {'value': 0}
+_invalidated = {}
+_cleared = {'value': 0}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def token():
+    """Отметка для cached(since=...): взять до чтения букетов из db"""
+    return _clock['value']
+
+def cached(bouquet_id, key, build, since=None):
+    """Объект из кэша; при промахе строится вызовом build() и сохраняется,
+    только если букет не сбрасывали после отметки since"""
+    entries = _cache.get(bouquet_id)
+    if entries is not None and key in entries:
+        _stats['hits'] += 1
+        return entries[key]
+
+    _stats['misses'] += 1
+    if since is None:
+        since = token()
+    value = build()
+    with _lock:
+        if _invalidated.get(bouquet_id, 0) <= since and _cleared['value'] <= since:
+            _cache.setdefault(bouquet_id, {})[key] = value
+    return value
+
+def invalidate(bouquet_ids=None):
+    """Сбросить записи букетов; None - весь кэш"""
+    with _lock:
+        _clock['value'] += 1
+        if bouquet_ids is None:
+            _cleared['value'] = _clock['value']
+            _invalidated.clear()
+            _cache.clear()
+        else:
+            for bouquet_id in bouquet_ids:
+                _invalidated[bouquet_id] = _clock['value']
+                _cache.pop(bouquet_id, None)
+
+def get_stats():
+    return dict(_stats, bouquets=len(_cache))
+
+# Изменения каталога приходят из потоков хранилища
+db.add_bouquet_hook(invalidate)
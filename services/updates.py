@@ -0,0 +1,54 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов разных пользователей.
+
+    Апдейты одного пользователя выполняются строго по очереди (в порядке
+    поступления), поэтому диалоги ConversationHandler и user_data не гоняются
+    сами с собой, а разные покупатели обслуживаются одновременно.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        # ключ -> [asyncio.Lock, сколько апдейтов держат/ждут блокировку]
+        self._locks = {}
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, 'effective_user', None)
+        if user:
+            return user.id
+        chat = getattr(update, 'effective_chat', None)
+        return chat.id if chat else None
+
+    async def process_update(self, update, coroutine):
+        # Блокировка пользователя берется до слота общего семафора: апдейты,
+        # ждущие своей очереди, не занимают слоты, и один покупатель, шлющий
+        # апдейты пачкой, не задерживает остальных.
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._locks.clear()
@@ -0,0 +1,198 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_BODY_SIZE = 1 << 20
+MAX_HEADERS = 100
+# Сколько ждать запрос целиком (вместе с простоем keep-alive-соединения)
+REQUEST_TIMEOUT = 30
+
+async def read_request(reader, max_size=MAX_BODY_SIZE, timeout=None):
+    """Прочитать один HTTP/1.1-запрос: (method, path, headers, body) или None при закрытии.
+
+    С timeout медленный или зависший клиент получает asyncio.TimeoutError
+    и не держит соединение бесконечно.
+    """
+    if timeout is None:
+        return await _read_request(reader, max_size)
+    return await asyncio.wait_for(_read_request(reader, max_size), timeout)
+
+async def _read_request(reader, max_size):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode('latin-1').split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise ValueError("Слишком много заголовков")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    if length < 0 or length > max_size:
+        raise ValueError("Слишком большой запрос")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+class WebhookServer:
+    """Минимальный HTTP-приёмник апдейтов Telegram на asyncio.
+
+    Без секретного токена не создается: иначе любой, кто знает путь, мог бы
+    прислать поддельный апдейт от имени админа. Проверяет токен, обрывает
+    медленные запросы (REQUEST_TIMEOUT), ограничивает число апдейтов в обработке
+    (пока лимит исчерпан, ответ Telegram задерживается - это и есть обратное
+    давление) и при остановке дожидается уже принятых апдейтов.
+    """
+
+    def __init__(self, application, listen, port, path, secret_token, max_in_flight=100):
+        if not secret_token:
+            raise ValueError("Для webhook нужен секретный токен (WEBHOOK_SECRET)")
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._secret = secret_token.encode('utf-8')
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._server = None
+        self._accepting = False
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        self._accepting = True
+        # Порт мог быть выбран системой (port=0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook слушает {self.listen}:{self.port}{self.path}")
+
+    async def stop(self, timeout=30):
+        """Перестать принимать апдейты и дообработать принятые"""
+        self._accepting = False
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._tasks:
+            logger.info(f"Дообработка {len(self._tasks)} апдейтов...")
+            await asyncio.wait(self._tasks, timeout=timeout)
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader, timeout=REQUEST_TIMEOUT)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status = await self._dispatch(method, path, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and self._accepting
+                self._write_response(writer, status, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, body):
+        if path.split('?', 1)[0] != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        # Заголовок прочитан как latin-1 - обратно в байты без потерь
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode('latin-1'), self._secret):
+            logger.warning("Webhook: неверный секретный токен")
+            return 403
+        if not self._accepting:
+            return 503
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Webhook: не удалось разобрать апдейт: {e}")
+            return 400
+
+        # Ждём свободный слот до ответа 200 - Telegram придержит следующие апдейты
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return 200
+
+    async def _process(self, update):
+        application = self.application
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception as e:
+            logger.error(f"Webhook: ошибка обработки апдейта: {e}")
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _write_response(writer, status, keep_alive):
+        reason = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+                  405: 'Method Not Allowed', 503: 'Service Unavailable'}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+        )
+
+async def serve_webhook(application, listen, port, path, secret_token, url=None,
+                        max_in_flight=100, allowed_updates=None, drop_pending_updates=False):
+    """Запустить бота в режиме webhook (аналог application.run_polling).
+
+    Без secret_token не запускается (ValueError).
+    """
+    server = WebhookServer(application, listen, port, path, secret_token, max_in_flight)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+
+        # Без публичного URL webhook в Telegram не регистрируется -
+        # так сервер можно гонять локально, отправляя записанные апдейты
+        if url:
+            await application.bot.set_webhook(
+                url=url,
+                secret_token=secret_token,
+                allowed_updates=allowed_updates,
+                max_connections=min(max_in_flight, 100),
+                drop_pending_updates=drop_pending_updates
+            )
+
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
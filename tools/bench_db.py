@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки хранилища (database/db.py и SQLite-бэкенда) на
+сгенерированных данных: по N заказов и N пользователей для каждого размера.
+
+Для каждой функции меряется время вызова (медиана/мин/макс по --repeat
+вызовам при прогретых кэшах) и пиковая память одного вызова (tracemalloc).
+Холодная загрузка данных - отдельной строкой warm_up (время и прирост RSS).
+Каждый размер гоняется в отдельном процессе, чтобы кэши не смешивались.
+
+Запуск: python -m tools.bench_db [--sizes 1000,100000,1000000] [--backend yaml|sqlite]
+        [--repeat 20] [--out bench_db_yaml.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк функций хранилища")
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help="размеры данных через запятую (заказов и пользователей)")
+    parser.add_argument('--backend', choices=['yaml', 'sqlite'], default='yaml')
+    parser.add_argument('--repeat', type=int, default=20, help="вызовов каждой функции")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="JSON с результатами (по умолчанию bench_db_<backend>.json)")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def generate_dataset(workdir, size, backend, seed):
+    """Данные как после долгой работы бота: заказы и пользователи уже в снимках.
+
+    Для SQLite заказы и пользователи пишутся в журналы (JSON читается быстро)
+    и переносятся в базу штатной migrate_from_yaml.
+    """
+    import yaml
+    from database import ids
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    rng = random.Random(seed)
+
+    shutil.copy(os.path.join('data', 'bouquets.yaml'), workdir)
+    with open(os.path.join(workdir, 'bouquets.yaml'), encoding='utf-8') as f:
+        bouquets = yaml.safe_load(f)['bouquets']
+    bouquet_ids = [b['id'] for b in bouquets]
+
+    now = datetime.now()
+    users = [{
+        'user_id': 100000 + i,
+        'username': f"user{i}",
+        'first_name': f"User{i}",
+        'last_name': '',
+        'registered_at': (now - timedelta(minutes=size - i)).isoformat()
+    } for i in range(size)]
+
+    def item(bouquet):
+        return {
+            'bouquet_id': bouquet['id'],
+            'bouquet_name': bouquet['name'],
+            'quantity': 51,
+            'packaging': 'standard',
+            'extras': {},
+            'date': now.date().isoformat(),
+            'time': '14:00',
+            'pickup': 'self',
+            'address': 'Самовывоз',
+            'total_price': 2300
+        }
+
+    # Заказы по возрастанию времени за последний год
+    orders = []
+    for i in range(size):
+        user = users[rng.randrange(size)]
+        created = now - timedelta(seconds=(size - i) * 365 * 86400 // size)
+        items = [item(rng.choice(bouquets))]
+        orders.append({
+            'order_id': ids.order_id_at(created.isoformat(), i),
+            'user_id': user['user_id'],
+            'user_name': user['username'],
+            'created_at': created.isoformat(),
+            'items': items,
+            'total_price': sum(it['total_price'] for it in items),
+            'status': rng.choice(['pending', 'completed', 'completed', 'cancelled'])
+        })
+
+    # Корзины у 10% пользователей, избранное у 20%
+    carts = {str(u['user_id']): [item(rng.choice(bouquets)) for _ in range(rng.randint(1, 3))]
+             for u in rng.sample(users, size // 10)}
+    favorites = {str(u['user_id']): rng.sample(bouquet_ids, rng.randint(1, min(3, len(bouquet_ids))))
+                 for u in rng.sample(users, size // 5)}
+
+    def dump(filename, data):
+        with open(os.path.join(workdir, filename), 'w', encoding='utf-8') as f:
+            yaml.dump(data, f, Dumper=dumper, allow_unicode=True)
+
+    def dump_journal(filename, records):
+        with open(os.path.join(workdir, filename), 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    dump('carts.yaml', {'carts': carts})
+    dump('favorites.yaml', {'favorites': favorites})
+    dump('admins.yaml', {'admins': []})
+    if backend == 'sqlite':
+        dump_journal('orders.jsonl', ({'seq': i + 1, 'data': o} for i, o in enumerate(orders)))
+        dump_journal('users.jsonl', ({'seq': i + 1, 'op': 'add', 'data': u} for i, u in enumerate(users)))
+    else:
+        dump('orders.yaml', {'orders': orders, 'last_seq': len(orders)})
+        dump('users.yaml', {'users': users, 'last_seq': len(users)})
+
+    # Покупатель с заказами - для get_user_orders и записи в корзину,
+    # заказ из середины истории - для get_order
+    return orders[-1]['user_id'], orders[size // 2]['order_id'], bouquet_ids, item(bouquets[0])
+
+def measure(func, repeat):
+    """Время (мс) repeat вызовов и пиковая память (КиБ) ещё одного вызова"""
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        func(repeat)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': repeat,
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'max_ms': max(timings),
+        'peak_kib': peak / 1024
+    }
+
+def max_rss_kib():
+    # ru_maxrss в Linux - в КиБ, в macOS - в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 if sys.platform == 'darwin' else rss
+
+def run_size(args):
+    """Прогон одного размера (в отдельном процессе); печатает JSON в stdout"""
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "bot.sqlite3")
+
+    try:
+        started = time.perf_counter()
+        user_id, order_id, bouquet_ids, cart_item = generate_dataset(workdir, args.size, args.backend, args.seed)
+        generated_s = time.perf_counter() - started
+
+        from database import db
+        db.DATA_DIR = workdir
+        if args.backend == 'sqlite':
+            from database import sqlite_backend
+            sqlite_backend.migrate_from_yaml()
+
+        results = {}
+        rss_before = max_rss_kib()
+        started = time.perf_counter()
+        db.warm_up()
+        results['warm_up'] = {
+            'calls': 1,
+            'median_ms': (time.perf_counter() - started) * 1000,
+            'rss_growth_kib': max_rss_kib() - rss_before
+        }
+
+        bouquet_id = bouquet_ids[-1]
+        new_user = 10 ** 9
+        benchmarks = [
+            ('get_bouquets', lambda i: db.get_bouquets()),
+            ('get_bouquet_by_id', lambda i: db.get_bouquet_by_id(bouquet_id)),
+            ('get_user_cart', lambda i: db.get_user_cart(user_id)),
+            ('add_to_cart', lambda i: db.add_to_cart(user_id, cart_item)),
+            ('remove_from_cart', lambda i: db.remove_from_cart(user_id, 0)),
+            ('get_favorites', lambda i: db.get_favorites(user_id)),
+            ('get_favorite_set', lambda i: db.get_favorite_set(user_id)),
+            ('toggle_favorite', lambda i: db.toggle_favorite(user_id, bouquet_id)),
+            ('create_order', lambda i: db.create_order(user_id, 'bench', [cart_item])),
+            ('get_user_orders', lambda i: db.get_user_orders(user_id)),
+            ('get_user_orders_last10', lambda i: db.get_user_orders(user_id, limit=10)),
+            ('get_order', lambda i: db.get_order(order_id)),
+            ('get_orders_page', lambda i: db.get_orders_page()),
+            ('get_orders_page_deep', lambda i: db.get_orders_page(before=order_id, status='completed')),
+            ('get_all_orders', lambda i: db.get_all_orders()),
+            ('is_admin', lambda i: db.is_admin(user_id)),
+            ('save_user_known', lambda i: db.save_user(user_id, 'bench', 'Bench')),
+            ('save_user_new', lambda i: db.save_user(new_user + i + 1000 * args.repeat, 'bench', 'Bench')),
+            ('touch_user', lambda i: db.touch_user(user_id)),
+            ('flush_users', lambda i: (db.touch_user(user_id), db.flush_users())),
+            ('get_users', lambda i: db.get_users()),
+            ('get_stats', lambda i: db.get_stats()),
+            ('update_bouquet', lambda i: db.update_bouquet(bouquet_id, {'description': f"v{i}"})),
+            ('increment_bouquet_orders', lambda i: db.increment_bouquet_orders(bouquet_id)),
+            ('get_photo_file_id', lambda i: db.get_photo_file_id(bouquet_id, 'hash')),
+        ]
+        for name, func in benchmarks:
+            print(f"  {args.size}: {name}", file=sys.stderr)
+            results[name] = measure(func, args.repeat)
+
+        # Сжатие журналов (только YAML) - один вызов, после записей выше
+        for name in ('compact_orders', 'compact_users'):
+            compact = getattr(db, name, None)
+            if compact and db.STORAGE_BACKEND == 'yaml':
+                started = time.perf_counter()
+                compact()
+                results[name] = {'calls': 1, 'median_ms': (time.perf_counter() - started) * 1000}
+
+        print(json.dumps({'generate_s': generated_s, 'functions': results}))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_table(size, functions, baseline=None):
+    print(f"\n== {size} заказов / пользователей ==")
+    header = f"{'функция':<26}{'медиана, мс':>13}{'мин, мс':>11}{'макс, мс':>11}{'пик, КиБ':>11}"
+    if baseline:
+        header += f"{'к базе':>9}"
+    print(header)
+    for name, row in functions.items():
+        memory = row.get('peak_kib', row.get('rss_growth_kib'))
+        line = (f"{name:<26}{row['median_ms']:>13.3f}{row.get('min_ms', row['median_ms']):>11.3f}"
+                f"{row.get('max_ms', row['median_ms']):>11.3f}"
+                + (f"{memory:>11.1f}" if memory is not None else f"{'-':>11}"))
+        if baseline:
+            base = baseline.get(name)
+            line += f"{row['median_ms'] / base['median_ms']:>8.2f}x" if base and base['median_ms'] else f"{'-':>9}"
+        print(line)
+
+def main():
+    args = parse_args()
+    if args.size:
+        run_size(args)
+        return
+
+    out = args.out or f"bench_db_{args.backend}.json"
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = {
+        'backend': args.backend,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started_at': datetime.now().isoformat(),
+        'sizes': {}
+    }
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f"Размер {size}: генерация данных и прогон...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, '-m', 'tools.bench_db', '--size', str(size), '--backend', args.backend,
+             '--repeat', str(args.repeat), '--seed', str(args.seed)],
+            stdout=subprocess.PIPE, check=True, text=True
+        )
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        report['sizes'][str(size)] = result
+        base = baseline['sizes'].get(str(size), {}).get('functions') if baseline else None
+        print_table(size, result['functions'], base)
+
+        # Сохраняем после каждого размера - длинный прогон не пропадёт целиком
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\nРезультаты: {out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Принимает запросы бота по адресу /bot<token>/<method> (form-urlencoded,
+multipart или JSON), записывает каждый вызов и отвечает правдоподобными
+объектами Message/User. Апдейты подкладываются через inject() и отдаются
+боту через getUpdates (long polling), как это делает настоящий Telegram.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qsl
+
+from services.webhook import read_request
+
+BOT_USER = {
+    'id': 1000000001,
+    'is_bot': True,
+    'first_name': 'FakeBot',
+    'username': 'fake_bot',
+    'can_join_groups': True,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False
+}
+
+# Параметры, которые PTB передаёт как JSON-строку
+JSON_PARAMS = {'reply_markup', 'media', 'allowed_updates', 'entities', 'caption_entities', 'commands'}
+
+MAX_UPLOAD_SIZE = 50 << 20
+
+def parse_params(headers, body):
+    """Разобрать параметры вызова; файлы заменяются описанием вида <file name, N bytes>"""
+    content_type = headers.get('content-type', '')
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True) or b''
+            if part.get_filename():
+                params[name] = f"<file {part.get_filename()}, {len(payload)} bytes>"
+            else:
+                params[name] = payload.decode('utf-8')
+    else:
+        params = dict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+    for key in JSON_PARAMS & params.keys():
+        try:
+            params[key] = json.loads(params[key])
+        except (TypeError, ValueError):
+            pass
+    return params
+
+class FakeBotAPI:
+    """HTTP-сервер, изображающий api.telegram.org для одного токена"""
+
+    def __init__(self, token, host='127.0.0.1', port=0, delay=0.0):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.calls = []
+        # Чаты, заблокировавшие бота: отправка в них получает 403
+        self.blocked = set()
+        self._chat_calls = defaultdict(list)
+        self._chat_changed = defaultdict(asyncio.Event)
+        self._updates = []
+        self._updates_added = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._next_file_id = 1
+        self._server = None
+        self._connections = {}
+        self._closing = False
+
+    @property
+    def base_url(self):
+        """Значение для ApplicationBuilder.base_url()"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        # Висящие long polling запросы завершаются сразу
+        self._closing = True
+        self._updates_added.set()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer, _ in list(self._connections.items()):
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+
+    def inject(self, update):
+        """Поставить апдейт в очередь getUpdates; возвращает присвоенный update_id"""
+        update = dict(update, update_id=self._next_update_id)
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._updates_added.set()
+        return update['update_id']
+
+    def chat_calls(self, chat_id):
+        return self._chat_calls[chat_id]
+
+    async def wait_call(self, chat_id, start, predicate=None, timeout=30):
+        """Дождаться вызова в чат chat_id с номером >= start, подходящего под predicate.
+
+        Возвращает (номер, вызов); номер+1 можно передать как start в следующий раз.
+        """
+        calls = self._chat_calls[chat_id]
+        deadline = time.monotonic() + timeout
+        while True:
+            for i in range(start, len(calls)):
+                if predicate is None or predicate(calls[i]):
+                    return i, calls[i]
+            start = len(calls)
+            event = self._chat_changed[chat_id]
+            event.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"Нет ответа в чат {chat_id}")
+            await asyncio.wait_for(event.wait(), remaining)
+
+    def method_counts(self):
+        return Counter(call['method'] for call in self.calls)
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request = await read_request(reader, MAX_UPLOAD_SIZE)
+                if request is None:
+                    break
+                _, path, headers, body = request
+                status, payload = await self._dispatch(path, headers, body)
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _dispatch(self, path, headers, body):
+        prefix = f"/bot{self.token}/"
+        if not path.startswith(prefix):
+            return 401, {'ok': False, 'error_code': 401, 'description': 'Unauthorized'}
+        method = path[len(prefix):].split('?', 1)[0]
+        params = parse_params(headers, body)
+
+        if method.lower() == 'getupdates':
+            return 200, {'ok': True, 'result': await self._get_updates(params)}
+
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if params.get('chat_id') is not None and int(params['chat_id']) in self.blocked:
+            return 403, {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}
+        result = self._call(method, params)
+
+        call = {'t': time.monotonic(), 'method': method, 'params': params, 'result': result}
+        self.calls.append(call)
+        chat_id = params.get('chat_id')
+        if chat_id is not None:
+            chat_id = int(chat_id)
+            self._chat_calls[chat_id].append(call)
+            self._chat_changed[chat_id].set()
+        return 200, {'ok': True, 'result': result}
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        # Апдейты с id меньше offset бот подтвердил
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates and timeout and not self._closing:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _call(self, method, params):
+        method = method.lower()
+        if method == 'getme':
+            return BOT_USER
+        if method == 'getwebhookinfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method.startswith('send'):
+            return self._message(params, self._new_message_id())
+        if method == 'copymessage':
+            return {'message_id': self._new_message_id()}
+        if method.startswith('edit'):
+            if 'inline_message_id' in params:
+                return True
+            return self._message(params, int(params['message_id']))
+        # answerCallbackQuery, setWebhook, deleteWebhook, deleteMessage и прочее
+        return True
+
+    def _new_message_id(self):
+        self._next_message_id += 1
+        return self._next_message_id
+
+    def _new_file(self, kind):
+        self._next_file_id += 1
+        return {'file_id': f"fake-{kind}-{self._next_file_id}", 'file_unique_id': f"u{self._next_file_id}"}
+
+    def _photo(self, value):
+        # Повторная отправка по file_id возвращает тот же file_id
+        if isinstance(value, str) and value.startswith('fake-photo-'):
+            file = {'file_id': value, 'file_unique_id': value.rsplit('-', 1)[-1]}
+        else:
+            file = self._new_file('photo')
+        return [dict(file, width=800, height=800)]
+
+    def _message(self, params, message_id):
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(params['chat_id']), 'type': 'private'},
+            'from': BOT_USER
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        if 'photo' in params:
+            message['photo'] = self._photo(params['photo'])
+        if 'document' in params:
+            message['document'] = dict(self._new_file('document'), file_name='document')
+        media = params.get('media')
+        if isinstance(media, dict):
+            if media.get('type') == 'photo':
+                message['photo'] = self._photo(media.get('media'))
+            if 'caption' in media:
+                message['caption'] = media['caption']
+        markup = params.get('reply_markup')
+        if isinstance(markup, dict) and 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        return message
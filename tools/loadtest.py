@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Сквозной нагрузочный тест: настоящий Application со всеми хендлерами
+работает против локальной замены Bot API (tools/fake_bot_api.py), а N
+покупателей одновременно проходят путь от /start и каталога до корзины.
+
+Для каждого шага считается задержка от отправки апдейта до ответа бота
+(p50/p95/p99), в конце выводится пропускная способность.
+
+Запуск: python -m tools.loadtest [--users 100] [--rounds 1] [--mode polling|webhook]
+        [--backend yaml|sqlite] [--api-delay 0] [--outbound-rate 30] [--json results.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+TOKEN = "123456:LOADTEST"
+WEBHOOK_SECRET = "loadtest-secret"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест бота")
+    parser.add_argument('--users', type=int, default=100, help="сколько покупателей одновременно")
+    parser.add_argument('--rounds', type=int, default=1, help="сколько раз каждый проходит путь до корзины")
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default='polling')
+    parser.add_argument('--backend', choices=['yaml', 'sqlite'], default='yaml')
+    parser.add_argument('--api-delay', type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument('--outbound-rate', type=float, default=30.0,
+                        help="лимит запросов бота к Bot API в секунду (0 - без лимита)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="ожидание ответа на шаг, с")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    return parser.parse_args()
+
+args = parse_args()
+workdir = tempfile.mkdtemp(prefix='loadtest_')
+
+# Конфиг и хранилище читают окружение при импорте
+os.environ["BOT_TOKEN"] = TOKEN
+os.environ["STORAGE_BACKEND"] = args.backend
+os.environ["SQLITE_PATH"] = os.path.join(workdir, "bot.sqlite3")
+os.environ["OUTBOUND_RATE"] = str(args.outbound_rate)
+
+from telegram.ext import Application
+
+import bot
+from database import db
+from services.webhook import WebhookServer
+from tools.fake_bot_api import FakeBotAPI
+
+# Каждый запрос к Bot API httpx пишет в лог - для нагрузки это шум
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+db.DATA_DIR = workdir
+shutil.copy(os.path.join("data", "bouquets.yaml"), workdir)
+if args.backend == 'sqlite':
+    from database import sqlite_backend
+    sqlite_backend.migrate_from_yaml()
+
+# Шаг: (имя, текст сообщения или префикс кнопки, префикс кнопки в ожидаемом ответе).
+# Кнопки берутся из клавиатуры предыдущего ответа бота, так что тест
+# не зависит от конкретных цен и дат.
+STEPS = [
+    ('start', '/start', None),
+    ('catalog', '🌹 Каталог', 'order:'),
+    ('page', 'cat:', 'order:'),
+    ('fav', 'fav:', 'order:'),
+    ('order', 'order:', 'qty:'),
+    ('qty', 'qty:', 'pkg:'),
+    ('pkg', 'pkg:', 'extra:done'),
+    ('extras', 'extra:done', 'date:'),
+    ('date', 'date:', 'time:'),
+    ('time', 'time:', 'pickup:self'),
+    ('pickup', 'pickup:self', 'confirm_cart'),
+    ('confirm', 'confirm_cart', None),
+]
+
+MENU_TEXTS = {'/start', '🌹 Каталог'}
+
+def find_button(message, prefix):
+    markup = message.get('reply_markup') or {}
+    for row in markup.get('inline_keyboard', []):
+        for button in row:
+            data = button.get('callback_data', '')
+            if data.startswith(prefix) and not data.endswith(':custom'):
+                return data
+    return None
+
+def expects(prefix):
+    """Предикат ответа бота: не answerCallbackQuery и с нужной кнопкой"""
+    def predicate(call):
+        if call['method'] == 'answerCallbackQuery' or not isinstance(call['result'], dict):
+            return False
+        return prefix is None or find_button(call['result'], prefix) is not None
+    return predicate
+
+class Customer:
+    def __init__(self, user_id, send):
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'username': f"user{user_id}"}
+        self.chat = {'id': user_id, 'type': 'private'}
+        self.send = send
+        self.ids = itertools.count(1)
+
+    def text_update(self, text):
+        message = {'message_id': next(self.ids), 'date': int(time.time()), 'chat': self.chat,
+                   'from': self.user, 'text': text}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        return {'message': message}
+
+    def button_update(self, message, data):
+        return {'callback_query': {'id': f"{self.user['id']}-{next(self.ids)}", 'from': self.user,
+                                   'chat_instance': str(self.user['id']), 'data': data, 'message': message}}
+
+async def run_customer(api, customer, latencies, errors):
+    user_id = customer.user['id']
+    cursor = 0
+    message = None
+    for _ in range(args.rounds):
+        for name, action, wanted in STEPS:
+            if action in MENU_TEXTS:
+                update = customer.text_update(action)
+            else:
+                data = find_button(message, action) if message else None
+                if data is None:
+                    errors[name] += 1
+                    return
+                update = customer.button_update(message, data)
+
+            started = time.perf_counter()
+            try:
+                await customer.send(update)
+                cursor, call = await api.wait_call(user_id, cursor, expects(wanted), args.timeout)
+            except (asyncio.TimeoutError, ConnectionError, RuntimeError):
+                errors[name] += 1
+                return
+            latencies[name].append(time.perf_counter() - started)
+            cursor += 1
+            message = call['result']
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+webhook_update_ids = itertools.count(1)
+
+async def post_webhook(port, update):
+    # В режиме polling update_id присваивает FakeBotAPI.inject, здесь - сами
+    update = dict(update, update_id=next(webhook_update_ids))
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(update).encode('utf-8')
+    writer.write(
+        f"POST /telegram HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {WEBHOOK_SECRET}\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    status = await reader.readline()
+    writer.close()
+    if b' 200 ' not in status:
+        raise RuntimeError(f"Webhook ответил: {status.decode().strip()}")
+
+async def main():
+    api = FakeBotAPI(TOKEN, delay=args.api_delay / 1000)
+    await api.start()
+
+    application = bot.build_application(Application.builder().token(TOKEN).base_url(api.base_url))
+    db.warm_up()
+    server = None
+
+    await application.initialize()
+    await application.post_init(application)
+    if args.mode == 'webhook':
+        server = WebhookServer(application, '127.0.0.1', 0, '/telegram', WEBHOOK_SECRET)
+        await server.start()
+        send = lambda update: post_webhook(server.port, update)
+    else:
+        await application.updater.start_polling(poll_interval=0, timeout=5, allowed_updates=bot.ALLOWED_UPDATES)
+        async def send(update):
+            api.inject(update)
+    await application.start()
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    customers = [Customer(500000 + i, send) for i in range(args.users)]
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*[run_customer(api, c, latencies, errors) for c in customers])
+        elapsed = time.perf_counter() - started
+    finally:
+        if server:
+            await server.stop()
+        else:
+            await application.updater.stop()
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+        await api.stop()
+
+    report(api, latencies, errors, elapsed)
+
+def report(api, latencies, errors, elapsed):
+    flows = len(latencies['confirm'])
+    updates = sum(len(v) for v in latencies.values())
+    print(f"Режим: {args.mode}, хранилище: {args.backend}, покупателей: {args.users}, кругов: {args.rounds}")
+    print(f"Время: {elapsed:.2f} с; оформлено {flows} заказов ({flows / elapsed:.1f}/с), "
+          f"{updates} апдейтов ({updates / elapsed:.1f}/с)")
+    print(f"{'шаг':<10}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}{'ошибок':>8}")
+
+    steps = {}
+    for name, _, _ in STEPS:
+        values = latencies[name]
+        row = {'count': len(values), 'errors': errors[name]}
+        if values:
+            row.update({
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000
+            })
+            print(f"{name:<10}{row['count']:>7}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+                  f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}{row['errors']:>8}")
+        else:
+            print(f"{name:<10}{0:>7}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{row['errors']:>8}")
+        steps[name] = row
+
+    counts = api.method_counts()
+    print("Вызовы Bot API: " + ", ".join(f"{m}={n}" for m, n in counts.most_common()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'mode': args.mode, 'backend': args.backend, 'users': args.users, 'rounds': args.rounds,
+                'api_delay_ms': args.api_delay, 'elapsed_s': elapsed, 'flows': flows,
+                'flows_per_s': flows / elapsed, 'updates_per_s': updates / elapsed,
+                'steps': steps, 'api_calls': dict(counts)
+            }, f, ensure_ascii=False, indent=2)
+
+    if any(errors.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
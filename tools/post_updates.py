@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Отправить записанные апдейты в локальный webhook бота (RUN_MODE=webhook).
+
+Файл - JSON-массив апдейтов или по одному апдейту в строке (JSON Lines).
+Запуск: python -m tools.post_updates updates.jsonl [--url http://127.0.0.1:8443/telegram] [--secret ...]
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+def load_updates(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def post_update(url, update, secret=None):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    if secret:
+        request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка записанных апдейтов в webhook")
+    parser.add_argument('file', help="JSON или JSON Lines с апдейтами")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{os.getenv('PORT', '8443')}{os.getenv('WEBHOOK_PATH', '/telegram')}")
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET'))
+    args = parser.parse_args()
+
+    failed = 0
+    for update in load_updates(args.file):
+        status = post_update(args.url, update, args.secret)
+        mark = '✓' if status == 200 else '❌'
+        print(f"{mark} update_id={update.get('update_id')} -> {status}")
+        failed += status != 200
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Стресс-тест хранилища: много покупателей одновременно пишут корзины,
+избранное и заказы через асинхронный фасад db.a*, а апдейты идут через
+PerUserUpdateProcessor. В конце проверяется, что ни одна запись не потеряна.
+
+Запуск: python -m tools.stress_db [--users 50] [--ops 20] [--backend yaml|sqlite]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Стресс-тест конкурентной записи в хранилище")
+    parser.add_argument('--users', type=int, default=50, help="сколько покупателей")
+    parser.add_argument('--ops', type=int, default=20, help="операций каждого вида на покупателя")
+    parser.add_argument('--backend', choices=['yaml', 'sqlite'], default='yaml')
+    return parser.parse_args()
+
+args = parse_args()
+workdir = tempfile.mkdtemp(prefix='stress_db_')
+
+# Хранилище выбирается при импорте db, поэтому окружение готовим заранее
+os.environ.setdefault("BOT_TOKEN", "0:stress-test")
+os.environ["STORAGE_BACKEND"] = args.backend
+os.environ["SQLITE_PATH"] = os.path.join(workdir, "bot.sqlite3")
+
+from database import db
+from services.updates import PerUserUpdateProcessor
+
+db.DATA_DIR = workdir
+shutil.copy(os.path.join("data", "bouquets.yaml"), workdir)
+if args.backend == 'sqlite':
+    from database import sqlite_backend
+    sqlite_backend.migrate_from_yaml()
+
+async def customer(user_id, bouquet_ids):
+    for i in range(args.ops):
+        await db.aadd_to_cart(user_id, {'bouquet_id': bouquet_ids[i % len(bouquet_ids)], 'n': i, 'total_price': 100})
+    
+    # Каждый букет добавляется в избранное ровно один раз
+    await asyncio.gather(*[db.atoggle_favorite(user_id, bid) for bid in bouquet_ids])
+    
+    for i in range(args.ops):
+        await db.acreate_order(user_id, f"user{user_id}", [{'bouquet_id': bouquet_ids[i % len(bouquet_ids)], 'total_price': 10}])
+    
+    await db.asave_user(user_id, f"user{user_id}", "Stress")
+
+async def check_processor_order():
+    """Апдейты одного пользователя должны выполняться по очереди и по порядку"""
+    processor = PerUserUpdateProcessor(max_concurrent_updates=16)
+    seen = {}
+    running = {}
+    overlaps = 0
+    
+    async def handle(user_id, n):
+        nonlocal overlaps
+        running[user_id] = running.get(user_id, 0) + 1
+        if running[user_id] > 1:
+            overlaps += 1
+        await asyncio.sleep(0.001 * (n % 3))
+        seen.setdefault(user_id, []).append(n)
+        running[user_id] -= 1
+    
+    async def submit(user_id, n):
+        update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None)
+        await processor.process_update(update, handle(user_id, n))
+    
+    async with processor:
+        tasks = [asyncio.create_task(submit(u, n)) for n in range(args.ops) for u in range(args.users)]
+        await asyncio.gather(*tasks)
+    
+    ordered = all(seq == sorted(seq) and len(seq) == args.ops for seq in seen.values())
+    return ordered and not overlaps
+
+async def check_processor_fairness():
+    """Очередь одного пользователя не должна занимать слоты остальных"""
+    processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+    burst = 50
+    delay = 0.02
+    
+    async def handle():
+        await asyncio.sleep(delay)
+    
+    def update(user_id):
+        return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None)
+    
+    async with processor:
+        # Один покупатель шлет пачку апдейтов, которые выполняются по очереди
+        flood = [asyncio.create_task(processor.process_update(update(0), handle())) for _ in range(burst)]
+        await asyncio.sleep(0)
+        
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*[processor.process_update(update(u), handle()) for u in range(1, 4)])
+        others = loop.time() - started
+        await asyncio.gather(*flood)
+    
+    # Остальные ждут не дольше пары своих апдейтов, а не всю пачку
+    return others < delay * burst / 4
+
+async def main():
+    bouquet_ids = [b['id'] for b in db.get_bouquets()]
+    base_counts = {b['id']: b.get('order_count', 0) for b in db.get_bouquets()}
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.gather(*[customer(u, bouquet_ids) for u in range(1, args.users + 1)])
+    elapsed = loop.time() - started
+    
+    errors = []
+    for user_id in range(1, args.users + 1):
+        cart = db.get_user_cart(user_id)
+        if len(cart) != args.ops:
+            errors.append(f"user {user_id}: в корзине {len(cart)} из {args.ops}")
+        if set(db.get_favorites(user_id)) != set(bouquet_ids):
+            errors.append(f"user {user_id}: избранное {db.get_favorites(user_id)}")
+        if len(db.get_user_orders(user_id)) != args.ops:
+            errors.append(f"user {user_id}: заказов {len(db.get_user_orders(user_id))} из {args.ops}")
+    
+    stats = db.get_stats()
+    expected_orders = args.users * args.ops
+    if stats['total_orders'] != expected_orders or len(db.get_all_orders()) != expected_orders:
+        errors.append(f"всего заказов {stats['total_orders']} / {len(db.get_all_orders())}, ожидалось {expected_orders}")
+    order_ids = [order['order_id'] for order in db.get_all_orders()]
+    if len(set(order_ids)) != len(order_ids):
+        errors.append(f"совпавших номеров заказов: {len(order_ids) - len(set(order_ids))}")
+    if stats['total_users'] != args.users:
+        errors.append(f"пользователей {stats['total_users']}, ожидалось {args.users}")
+    
+    added = sum(b.get('order_count', 0) - base_counts[b['id']] for b in db.get_bouquets())
+    if added != expected_orders:
+        errors.append(f"счетчики букетов выросли на {added}, ожидалось {expected_orders}")
+    
+    if not await check_processor_order():
+        errors.append("PerUserUpdateProcessor нарушил порядок апдейтов одного пользователя")
+    
+    if not await check_processor_fairness():
+        errors.append("PerUserUpdateProcessor: апдейты одного пользователя задержали остальных")
+    
+    writes = args.users * (args.ops * 2 + len(bouquet_ids) + 1)
+    print(f"📦 {args.backend}: {args.users} покупателей, {writes} записей за {elapsed:.2f}с")
+    if errors:
+        print(f"❌ Потеряно/испорчено записей: {len(errors)}")
+        for error in errors[:20]:
+            print(f"  - {error}")
+        return 1
+    print("✅ Все записи на месте")
+    return 0
+
+if __name__ == '__main__':
+    try:
+        code = asyncio.run(main())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(code)